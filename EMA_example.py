@@ -1,6 +1,7 @@
 from datetime import datetime
 import backtrader as bt
-import backtrader.feeds as btfeeds
+import runner
+from fastdt import bardatetime
 
 
 class EMAStrategy(bt.Strategy):
@@ -9,7 +10,7 @@ class EMAStrategy(bt.Strategy):
     )
     def log(self, txt, dt=None):
        ''' Logging function for this strategy'''
-       dt = dt or self.datas[0].datetime.datetime()
+       dt = dt or bardatetime(self.datas[0])
        print('%s, %s' % (dt.strftime("%d/%m/%Y %H:%M:%S"), txt))
 
     def __init__(self):
@@ -90,47 +91,16 @@ class EMAStrategy(bt.Strategy):
                 self.order = self.sell()
 
 def main():
-    cerebro = bt.Cerebro()
-     # Add a strategy
-    cerebro.addstrategy(EMAStrategy)
-
-    data = btfeeds.GenericCSVData(
-        dataname='binance.csv',
-        fromdate=datetime(2018,3,1),
-        todate=datetime(2018,3,2),
-
-        dtformat=("%d/%m/%Y %H:%M:%S"),
-        timeframe=bt.TimeFrame.Minutes,
-
-        datetime=0,
-        open=1,
-        high=2,
-        low=3,
-        close=4,
-        volume=5,
-        openinterest=-1
-    )
-
-    cerebro.adddata(data)
-
-    # Add a FixedSize sizer according to the stake
-    #cerebro.addsizer(bt.sizers.FixedSize, stake=10)
-
-     # Set our desired cash start
-    cerebro.broker.setcash(50000.0)
-
-    # Set the commission
-    cerebro.broker.setcommission(commission=0.00)
-    
-    # Print out the starting conditions
-    print('Starting Portfolio Value: %.8f' % cerebro.broker.getvalue())
-
-    # Run over everything
-    cerebro.run()
-
-    # Print out the final result
-    print('Final Portfolio Value: %.8f' % cerebro.broker.getvalue())
-    cerebro.plot(style='candlestick')
+    runner.run(dict(
+        strategy=EMAStrategy,
+        data=dict(
+            dataname='binance.csv',
+            fromdate=datetime(2018,3,1),
+            todate=datetime(2018,3,2),
+        ),
+        broker=dict(cash=50000.0, commission=0.00),
+        plot=True,
+    ))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
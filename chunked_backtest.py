@@ -0,0 +1,142 @@
+import argparse
+import itertools
+import sys
+from collections import deque
+from datetime import datetime
+
+import backtrader as bt
+
+import runner
+from dual_ema_example import EMAStrategy
+from fastdt import FastCSVData
+
+
+class ChunkedCSVData(FastCSVData):
+    '''
+    FastCSVData that never holds more than ``chunksize`` raw lines of
+    the file in memory.
+
+    Lines are pulled from disk in fixed-size chunks and handed one by one
+    to the regular line parser. The chunk only re-buffers the file: what
+    bounds memory is running with ``preload=False`` and ``exactbars=1``
+    (see ``make_cerebro``), which keep just the bars the strategy needs.
+    '''
+    params = (
+        ('chunksize', 10000),
+    )
+
+    def start(self):
+        super(ChunkedCSVData, self).start()
+        self._chunk = deque()
+
+    def _nextchunk(self):
+        # Read the next block of lines from disk, empty when exhausted
+        self._chunk.extend(itertools.islice(self.f, self.p.chunksize))
+        return bool(self._chunk)
+
+    def _getnextline(self):
+        if self.f is None:
+            return None
+
+        if not self._chunk and not self._nextchunk():
+            return None
+
+        line = self._chunk.popleft().rstrip('\n')
+        return line.split(self.separator)
+
+    def _load(self):
+        linetokens = self._getnextline()
+        if linetokens is None:
+            return False
+
+        return self._loadline(linetokens)
+
+
+def make_cerebro(chunksize=None):
+    '''
+    Out-of-core mode (``chunksize`` given) streams the data bar by bar and
+    keeps only the minimum line buffers (``exactbars=1``). Indicators still
+    see one continuous series, so their warm-up carries across chunks.
+    '''
+    if chunksize is None:
+        return bt.Cerebro()
+
+    return bt.Cerebro(preload=False, runonce=False, exactbars=1)
+
+
+def run(dataname, fromdate=None, todate=None, chunksize=None):
+    config = runner.merge(dict(
+        strategy=EMAStrategy,
+        data=dict(dataname=dataname, fromdate=fromdate, todate=todate),
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+        analyzers=dict(ta='TradeAnalyzer', sqn='SQN'),
+        mode='memory' if chunksize is None else 'chunked',
+        chunksize=chunksize,
+    ))
+    cerebro = runner.makecerebro(config)
+
+    results = cerebro.run()
+    runst = results[0]
+    return dict(
+        value=cerebro.broker.getvalue(),
+        cash=cerebro.broker.getcash(),
+        ta=runst.analyzers.ta.get_analysis(),
+        sqn=runst.analyzers.sqn.get_analysis(),
+    )
+
+
+def compare(dataname, chunksize, fromdate=None, todate=None):
+    '''
+    Run the same backtest in memory and out-of-core and check that the
+    results are bit-identical. Returns the list of mismatching keys.
+    '''
+    inmem = run(dataname, fromdate, todate)
+    chunked = run(dataname, fromdate, todate, chunksize=chunksize)
+
+    return [key for key in inmem if inmem[key] != chunked[key]]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Out-of-core (chunked) backtest of EMAStrategy')
+
+    parser.add_argument('--data', default='binance.csv',
+                        help='Binance formatted csv file')
+    parser.add_argument('--fromdate', default=None,
+                        help='Starting date in YYYY-MM-DD format')
+    parser.add_argument('--todate', default=None,
+                        help='Ending date in YYYY-MM-DD format')
+    parser.add_argument('--chunksize', type=int, default=10000,
+                        help='Lines of the csv file read from disk at once '
+                             '(memory is bounded by exactbars=1, not by '
+                             'this)')
+    parser.add_argument('--compare', action='store_true',
+                        help='Check results against an in-memory run')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fromdate = todate = None
+    if args.fromdate:
+        fromdate = datetime.strptime(args.fromdate, '%Y-%m-%d')
+    if args.todate:
+        todate = datetime.strptime(args.todate, '%Y-%m-%d')
+
+    if args.compare:
+        mismatches = compare(args.data, args.chunksize, fromdate, todate)
+        if mismatches:
+            sys.exit('MISMATCH: %s' % ', '.join(mismatches))
+
+        print('Chunked run is identical to the in-memory run')
+        return
+
+    result = run(args.data, fromdate, todate, chunksize=args.chunksize)
+    print('Final Portfolio Value: %.8f' % result['value'])
+    print('SQN: {}'.format(round(result['sqn'].sqn, 2)))
+
+
+if __name__ == '__main__':
+    main()
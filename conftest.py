@@ -0,0 +1,11 @@
+import pytest
+
+from generate_data import generate
+
+
+@pytest.fixture(scope='session')
+def datafile(tmp_path_factory):
+    '''3000 generated binance format minute bars (seed 7), shared by all'''
+    path = tmp_path_factory.mktemp('data') / 'binance.csv'
+    generate(str(path), 3000, seed=7)
+    return str(path)
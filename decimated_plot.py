@@ -0,0 +1,208 @@
+import bisect
+import datetime
+import math
+
+import numpy as np
+from backtrader.utils.date import date2num, num2date
+
+# Above this number of bars cerebro.plot is replaced by plotdecimated
+MAXBARS = 5000
+
+# Sparse observer lines drawn as markers: line name -> marker style
+MARKERS = dict(
+    buy=dict(marker='^', color='g'),
+    sell=dict(marker='v', color='r'),
+    pnlplus=dict(marker='o', color='b'),
+    pnlminus=dict(marker='o', color='r'),
+)
+
+
+def buckets(size, width):
+    '''
+    Start indices of ``width`` consecutive, equally sized groups of bars
+    over ``size`` bars (one group per bar if there are fewer bars).
+    '''
+    width = min(size, width)
+    return np.linspace(0, size, width + 1).astype(np.int64)[:-1]
+
+
+def lastof(values, starts):
+    # Last value of each bucket
+    return values[np.append(starts[1:], len(values)) - 1]
+
+
+def plotrange(dts, start=None, end=None):
+    '''
+    Bar index bounds of the range to plot, as cerebro.plot takes them:
+    ``start`` / ``end`` are bar indices or dates (``end`` included)
+    '''
+    if start is None:
+        start = 0
+    elif isinstance(start, datetime.date):
+        start = bisect.bisect_left(dts, date2num(start))
+
+    if end is None:
+        end = len(dts)
+    elif isinstance(end, datetime.date):
+        end = bisect.bisect_right(dts, date2num(end))
+
+    return start, end
+
+
+def ohlc(data, starts, view=slice(None)):
+    '''
+    Re-aggregates the bars of ``data`` (the ``view`` slice of them) into
+    one OHLC candle per bucket: first open, highest high, lowest low and
+    last close
+    '''
+    size = data.buflen()
+    o = _array(data.open, size)[view]
+    h = _array(data.high, size)[view]
+    l = _array(data.low, size)[view]
+    c = _array(data.close, size)[view]
+    return (o[starts],
+            np.fmax.reduceat(h, starts),
+            np.fmin.reduceat(l, starts),
+            lastof(c, starts))
+
+
+def minmax(values, starts):
+    '''
+    Lowest and highest value of each bucket. Drawn as a vertical segment
+    per bucket this is what the full line looks like at that width.
+    NaN (e.g. indicator warm-up) is ignored, all-NaN buckets stay NaN.
+    '''
+    return (np.fmin.reduceat(values, starts),
+            np.fmax.reduceat(values, starts))
+
+
+def _array(line, size):
+    values = np.frombuffer(line.array, dtype=np.float64)
+    return values[:size]
+
+
+def _lines(obj, size, view=slice(None)):
+    for i, alias in enumerate(obj.lines.getlinealiases()):
+        lineplot = getattr(obj.plotlines, alias, None)
+        if lineplot is not None and getattr(lineplot, '_plotskip', False):
+            continue
+        yield alias, _array(obj.lines[i], size)[view]
+
+
+def _plotline(ax, x, alias, values, starts, label):
+    style = MARKERS.get(alias)
+    if style is not None:
+        # A bucket with several trades shows the extreme value
+        reduce = np.fmin if alias in ('buy', 'pnlminus') else np.fmax
+        points = reduce.reduceat(values, starts)
+        mask = ~np.isnan(points)
+        if mask.any():
+            ax.scatter(x[mask], points[mask], label=label, zorder=3, **style)
+        return
+
+    lo, hi = minmax(values, starts)
+    xs = np.repeat(x, 2)
+    ys = np.column_stack((lo, hi)).ravel()
+    ax.plot(xs, ys, linewidth=1.0, label=label)
+
+
+def _plotcandles(ax, x, o, h, l, c):
+    up = c >= o
+    ax.vlines(x, l, h, color='k', linewidth=0.5)
+    for mask, color in ((up, 'g'), (~up, 'r')):
+        ax.bar(x[mask], (c - o)[mask], bottom=o[mask], width=0.8,
+               color=color, edgecolor=color, linewidth=0)
+
+
+def plotdecimated(strategy, data=None, width=1600, height=900, dpi=100,
+                  savefig=None, start=None, end=None):
+    '''
+    Plots a finished (preloaded, non exactbars) strategy run with the data
+    reduced to ``width`` buckets: candles are OHLC re-aggregated, lines are
+    min/max envelopes and buy/sell/trade markers keep their exact values.
+
+    ``start`` and ``end`` restrict the plot to a range of bars, as in
+    cerebro.plot (bar indices or dates): only that range is decimated.
+
+    The cost of drawing depends on ``width``, not on the number of bars.
+    '''
+    # matplotlib only for runs which really plot
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import FuncFormatter
+
+    # not "data or": a line object's truth value builds an indicator
+    if data is None:
+        data = strategy.datas[0]
+    size = data.buflen()
+    alldts = _array(data.datetime, size)
+    first, last = plotrange(alldts, start, end)
+    if first >= last:
+        raise ValueError('No bars between start and end')
+
+    view = slice(first, last)
+    starts = buckets(last - first, width)
+    x = np.arange(len(starts))
+    dts = alldts[view][starts]
+
+    ontop = []
+    subplots = []
+    for ind in strategy.getindicators():
+        # line operations (e.g. trigger conditions) have nothing to plot
+        if not hasattr(ind, 'plotinfo') or not ind.plotinfo.plot:
+            continue
+        (subplots if ind.plotinfo.subplot else ontop).append(ind)
+
+    for obs in strategy.getobservers():
+        if not obs.plotinfo.plot:
+            continue
+        (subplots if obs.plotinfo.subplot else ontop).append(obs)
+
+    nrows = 1 + len(subplots)
+    ratios = [3] + [1] * len(subplots)
+    fig, axes = plt.subplots(nrows, 1, sharex=True, squeeze=False,
+                             figsize=(width / dpi, height / dpi), dpi=dpi,
+                             gridspec_kw=dict(height_ratios=ratios))
+    axes = axes[:, 0]
+
+    ax = axes[0]
+    _plotcandles(ax, x, *ohlc(data, starts, view))
+    for obj in ontop:
+        for alias, values in _lines(obj, size, view):
+            label = '%s %s' % (obj.plotlabel(), alias)
+            _plotline(ax, x, alias, values, starts, label)
+
+    for sax, obj in zip(axes[1:], subplots):
+        for alias, values in _lines(obj, size, view):
+            _plotline(sax, x, alias, values, starts, alias)
+        sax.set_ylabel(obj.__class__.__name__)
+
+    def dtformat(tick, pos=None):
+        idx = int(tick)
+        if idx < 0 or idx >= len(dts) or math.isnan(dts[idx]):
+            return ''
+        return num2date(dts[idx]).strftime('%d/%m/%Y %H:%M')
+
+    axes[-1].xaxis.set_major_formatter(FuncFormatter(dtformat))
+    for a in axes:
+        if a.get_legend_handles_labels()[0]:
+            a.legend(loc='upper left', fontsize='small')
+        a.grid(True, linestyle=':')
+
+    fig.autofmt_xdate()
+    if savefig:
+        fig.savefig(savefig, dpi=dpi)
+    else:
+        plt.show()
+
+    return fig
+
+
+def plot(cerebro, strategy, maxbars=MAXBARS, **kwargs):
+    '''
+    cerebro.plot(style='candlestick') for short runs, plotdecimated when
+    the data has more than ``maxbars`` bars
+    '''
+    if strategy.datas[0].buflen() <= maxbars:
+        return cerebro.plot(style='candlestick')
+
+    return plotdecimated(strategy, **kwargs)
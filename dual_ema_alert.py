@@ -1,7 +1,10 @@
 import datetime as dtime
 from datetime import datetime
 import backtrader as bt
-import backtrader.feeds as btfeeds
+import runner
+from triggers import TriggerStrategy
+from fastdt import bardatetime, num2dt
+from metrics import RunMetrics
 
 
 def alert(order):
@@ -13,12 +16,12 @@ def alert(order):
         print("VENDA ETH por {:8f}".format(price))
     print(" ")
     dt = order.executed.exbits[0].dt
-    datetm = datetime.utcfromtimestamp(dt)
+    datetm = num2dt(dt)
     #print("Exbits datetime(float):", datetm)
     #print("Exbits price:", price)
     
 
-class EMAStrategy(bt.Strategy):
+class EMAStrategy(TriggerStrategy):
     params = (
         ('maperiod', 15),
         ('shortperiod', 20),
@@ -26,7 +29,7 @@ class EMAStrategy(bt.Strategy):
     )
     def log(self, txt, dt=None):
        ''' Logging function for this strategy'''
-       dt = dt or self.datas[0].datetime.datetime()
+       dt = dt or bardatetime(self.datas[0])
        #print('%s, %s' % (dt.strftime("%d/%m/%Y %H:%M:%S"), txt))
 
     def __init__(self):
@@ -47,6 +50,12 @@ class EMAStrategy(bt.Strategy):
             self.datas[0], period=self.params.longperiod
         )
 
+        # The decision can only change when the averages cross, skip
+        # calling next on any other bar
+        self.addtrigger(
+            bt.indicators.CrossOver(self.short_ema, self.long_ema) != 0
+        )
+
     def notify_order(self, order):
         if order.status in [order.Submitted, order.Accepted]:
             # Buy/Sell order submitted/accepted to/by broker - Nothing to do
@@ -74,7 +83,8 @@ class EMAStrategy(bt.Strategy):
             self.bar_executed = len(self)
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
-            self.log('Order Canceled/Margin/Rejected')
+            # Counted by status in the exported metrics
+            self.log('Order %s' % order.getstatusname())
 
         self.order = None
 
@@ -118,83 +128,23 @@ class EMAStrategy(bt.Strategy):
         print('(MA Period %2d) Ending Value %.8f' %
                  (self.params.maperiod, self.broker.getvalue()))
 
-def printAnalyzersInfo(analyzer):
-    analysis = analyzer.get_analysis()
-    if isinstance(analyzer, bt.analyzers.TradeAnalyzer):
-        total_open = analysis.total.open
-        total_closed = analysis.total.closed
-        total_won = analysis.won.total
-        total_lost = analysis.lost.total
-        strike_rate = (total_won / total_closed) * 100
-        print('Winning Percent: {:6f}'.format(strike_rate))
-        print('Total Trade: {}'.format(total_closed))
-        print('Profit Factor: {}'.format(analysis.won.pnl.total/analysis.lost.pnl.total))
-        print('Net Profit: {}'.format(analysis.pnl.net.total))
-        print('AVG win: {}'.format(analysis.won.pnl.average))
-        print('AVG loss: {}'.format(analysis.lost.pnl.average))
-        print('MAX DRAWN: {}'.format(analysis.lost.pnl.max))
-            
-    if isinstance(analyzer, bt.analyzers.SQN):
-        sqn = round(analysis.sqn,2)
-        print('SQN: {}'.format(sqn))
-
 def main():
-    cerebro = bt.Cerebro() # stdstats=False
-
-     # Add a strategy
-    cerebro.addstrategy(EMAStrategy)
-    #cerebro.optstrategy(
-    #    EMAStrategy,
-    #    maperiod=range(10, 31)
-    #)
-    data = btfeeds.GenericCSVData(
-        dataname='binance.csv',
-        fromdate=datetime(2017,7,17),
-        todate=datetime(2017,7,20),
-
-        dtformat=("%d/%m/%Y %H:%M:%S"),
-        timeframe=bt.TimeFrame.Minutes,
-
-        datetime=0,
-        open=1,
-        high=2,
-        low=3,
-        close=4,
-        volume=5,
-        openinterest=-1
-    )
-
-    cerebro.adddata(data)
-    # Add a FixedSize sizer according to the stake
-    cerebro.addsizer(bt.sizers.PercentSizer, percents=99)
-
-    # Set our desired cash start
-    cerebro.broker.setcash(0.50)
-
-    # Set the commission
-    cerebro.broker.setcommission(commission=0.001)
-    
-    # Print out the starting conditions
-    print('Starting Portfolio Value: %.8f' % cerebro.broker.getvalue())
-    
-    # add analyzers
-    # Add the analyzers we are interested in
-    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="ta")
-    cerebro.addanalyzer(bt.analyzers.SQN, _name="sqn")
-    cerebro.addanalyzer(bt.analyzers.Returns, _name="returns")
-
-    # Run over everything
-    results = cerebro.run()
-    runst = results[0]
-    # Print out the final result
-    print('Final Portfolio Value: %.8f' % cerebro.broker.getvalue())
-    print('====================')
-    print('== Analyzers')
-    print('====================')
-    analyzers = ["ta","sqn"]
-    for name in analyzers:
-        printAnalyzersInfo(runst.analyzers.getbyname(name))
-    print('---')
+    runner.run(dict(
+        strategy=EMAStrategy,
+        data=dict(
+            dataname='binance.csv',
+            fromdate=datetime(2017,7,17),
+            todate=datetime(2017,7,20),
+        ),
+        # Add a PercentSizer sizer, 99% of the cash on each order
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+        analyzers=dict(
+            ta='TradeAnalyzer', sqn='SQN', returns='Returns',
+            # Prometheus text file, rewritten every 10 seconds
+            metrics=dict(name=RunMetrics, path='dual_ema_alert.prom'),
+        ),
+    ))
 
 
 if __name__ == '__main__':
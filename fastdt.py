@@ -0,0 +1,271 @@
+import argparse
+import bisect
+import itertools
+import math
+import operator
+import time
+from array import array
+from datetime import datetime
+from functools import lru_cache
+
+import backtrader as bt
+import backtrader.feeds as btfeeds
+from backtrader.utils.date import num2date
+
+# The only datetime format used by binance.csv
+BINANCE_DTFORMAT = '%d/%m/%Y %H:%M:%S'
+
+
+@lru_cache(maxsize=4096)
+def _daynum(day):
+    # 'dd/mm/YYYY' -> float ordinal, as backtrader's date2num does it
+    return float(datetime(int(day[6:10]), int(day[3:5]),
+                          int(day[0:2])).toordinal())
+
+
+@lru_cache(maxsize=86400)
+def _timenum(tm):
+    # 'HH:MM:SS' -> the fractions of day summed by backtrader's date2num
+    return (int(tm[0:2]) / 24.0, int(tm[3:5]) / 1440.0,
+            int(tm[6:8]) / 86400.0, 0.0)
+
+
+def dtnum(dtstr):
+    '''
+    Converts a ``dd/mm/YYYY HH:MM:SS`` string straight to the backtrader
+    float datetime, without going through ``strptime`` nor creating a
+    datetime object. The result is bit-identical to
+    ``date2num(datetime.strptime(dtstr, BINANCE_DTFORMAT))``.
+    '''
+    return math.fsum((_daynum(dtstr[0:10]),) + _timenum(dtstr[11:19]))
+
+
+def dtnums(column):
+    '''Converts a whole column of datetime strings at once'''
+    # Rows of the same day/time of day share the cached parts
+    fsum, daynum, timenum = math.fsum, _daynum, _timenum
+    return [fsum((daynum(x[0:10]),) + timenum(x[11:19])) for x in column]
+
+
+@lru_cache(maxsize=1024)
+def num2dt(num):
+    '''
+    Cached ``num2date``. Log lines and alerts convert the same bar
+    datetime several times (order notification, trade, next), only the
+    first one pays for the conversion.
+    '''
+    return num2date(num)
+
+
+def bardatetime(data, ago=0):
+    '''Same as ``data.datetime.datetime(ago)`` for naive feeds, but cached'''
+    return num2dt(data.datetime[ago])
+
+
+def readcolumns(f, separator=',', name=None):
+    '''Reads the remaining lines of ``f`` as a list of columns of strings'''
+    rows = [line.rstrip('\n').split(separator) for line in f]
+    if not rows:
+        return []
+
+    ncols = len(rows[0])
+    if any(len(row) != ncols for row in rows):
+        raise ValueError('Malformed line in %s' % (name or f))
+
+    return list(zip(*rows))
+
+
+def floats(column, nullvalue=float('NaN')):
+    try:
+        return list(map(float, column))
+    except ValueError:
+        return [float(x) if x != '' else nullvalue for x in column]
+
+
+# (dataname, datetime column) -> (datetimes, columns) filled by cachefile
+_cache = {}
+
+
+def _issorted(values):
+    return all(map(operator.le, values, itertools.islice(values, 1, None)))
+
+
+def cachefile(dataname, datetime=0, separator=',', headers=True):
+    '''
+    Reads and converts ``dataname`` once. Every FastCSVData of the same
+    file (and datetime column) created afterwards in this process, or in
+    processes forked from it, preloads from memory instead of parsing the
+    file again.
+
+    The datetimes and columns are kept in ``array('d')`` buffers, not in
+    lists of floats: forked workers only read the pages of the buffers
+    and never write to them (no reference counts of float objects), so
+    they stay shared with the parent instead of being copied into every
+    worker.
+    '''
+    with open(dataname, 'r') as f:
+        if headers:
+            f.readline()
+        columns = readcolumns(f, separator, dataname)
+
+    dts = array('d', dtnums(columns[datetime]) if columns else [])
+    columns = [None if i == datetime else array('d', floats(column))
+               for i, column in enumerate(columns)]
+    _cache[(dataname, datetime)] = (dts, columns)
+
+
+class FastCSVData(btfeeds.GenericCSVData):
+    '''
+    GenericCSVData with a fixed-format fast path for the datetime column.
+
+    When the feed is intraday, has no separate time column, no input
+    timezone and ``dtformat`` is ``BINANCE_DTFORMAT``, the datetime is
+    converted with ``dtnum``. Any other configuration falls back to the
+    regular GenericCSVData parsing.
+    '''
+    params = (
+        ('dtformat', BINANCE_DTFORMAT),
+    )
+
+    def start(self):
+        super(FastCSVData, self).start()
+
+        self._fastdt = (self._dtstr and
+                        self.p.dtformat == BINANCE_DTFORMAT and
+                        self.p.time < 0 and
+                        self.p.tzinput is None and
+                        self.p.timeframe < bt.TimeFrame.Days)
+
+        # (line, csv index) for the rest of the fields, done once
+        self._fields = []
+        for linefield in self.getlinealiases():
+            if linefield == 'datetime':
+                continue
+            csvidx = getattr(self.params, linefield)
+            if csvidx is None or csvidx < 0:
+                csvidx = None
+            self._fields.append((getattr(self.lines, linefield), csvidx))
+
+    def _loadline(self, linetokens):
+        if not self._fastdt:
+            return super(FastCSVData, self)._loadline(linetokens)
+
+        self.lines.datetime[0] = dtnum(linetokens[self.p.datetime])
+
+        nullvalue = self.p.nullvalue
+        for line, csvidx in self._fields:
+            if csvidx is None:
+                line[0] = float(nullvalue)
+                continue
+
+            csvfield = linetokens[csvidx]
+            line[0] = float(csvfield) if csvfield != '' else float(nullvalue)
+
+        return True
+
+    def preload(self):
+        '''
+        Without filters the whole file is converted column by column and
+        appended to the line buffers in one go, instead of bar by bar
+        through ``load``. The resulting buffers are the same.
+        '''
+        if not self._fastdt or self._filters or self._barstack:
+            return super(FastCSVData, self).preload()
+
+        nullvalue = float(self.p.nullvalue)
+        cached = _cache.get((self.p.dataname, self.p.datetime))
+        if cached is not None and math.isnan(nullvalue):
+            # Already converted by cachefile, just pick the columns
+            dts, columns = cached
+        else:
+            columns = readcolumns(self.f, self.separator, self.p.dataname)
+            dts = dtnums(columns[self.p.datetime]) if columns else []
+
+        self.f.close()
+        self.f = None
+
+        # Same from/to rules as load: skip before fromdate, stop after todate
+        if _issorted(dts):
+            first = bisect.bisect_left(dts, self.fromdate)
+            last = bisect.bisect_right(dts, self.todate)
+            select = lambda column: column[first:last]
+        else:
+            last = next((i for i, dt in enumerate(dts)
+                         if dt > self.todate), len(dts))
+            keep = [i for i in range(last) if dts[i] >= self.fromdate]
+            select = lambda column: [column[i] for i in keep]
+
+        dts = select(dts)
+        self.lines.datetime.array.extend(dts)
+
+        for line, csvidx in self._fields:
+            if csvidx is None:
+                line.array.extend([nullvalue] * len(dts))
+            elif cached is not None:
+                line.array.extend(select(columns[csvidx]))
+            else:
+                line.array.extend(floats(select(columns[csvidx]), nullvalue))
+
+        self._last()
+        self.home()
+
+
+def _loadfeed(datacls, dataname):
+    data = datacls(
+        dataname=dataname,
+        dtformat=BINANCE_DTFORMAT,
+        timeframe=bt.TimeFrame.Minutes,
+
+        datetime=0,
+        open=1,
+        high=2,
+        low=3,
+        close=4,
+        volume=5,
+        openinterest=-1
+    )
+    # A cerebro is only needed as the environment of the feed
+    bt.Cerebro().adddata(data)
+    data._start()
+    data.preload()
+    return data
+
+
+def benchmark(dataname):
+    '''
+    Preloads ``dataname`` with GenericCSVData and FastCSVData, checks every
+    line is bit-identical and prints the load times.
+    '''
+    timings = []
+    datas = []
+    for datacls in (btfeeds.GenericCSVData, FastCSVData):
+        start = time.perf_counter()
+        datas.append(_loadfeed(datacls, dataname))
+        timings.append(time.perf_counter() - start)
+
+    slow, fast = datas
+    identical = all(
+        getattr(slow.lines, name).array.tobytes() ==
+        getattr(fast.lines, name).array.tobytes()
+        for name in slow.getlinealiases())
+
+    print('Bars: {}'.format(slow.buflen()))
+    print('GenericCSVData: {:.3f}s'.format(timings[0]))
+    print('FastCSVData: {:.3f}s'.format(timings[1]))
+    print('Speedup: {:.1f}x'.format(timings[0] / timings[1]))
+    print('Identical: {}'.format(identical))
+    return identical
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the fast datetime csv feed')
+
+    parser.add_argument('--data', default='binance.csv',
+                        help='Binance formatted csv file')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    benchmark(parse_args().data)
@@ -0,0 +1,326 @@
+import argparse
+from datetime import datetime
+
+import numpy as np
+import backtrader as bt
+
+import fastdt
+from fastdt import FastCSVData
+
+# Length of one bar of each timeframe in days (backtrader date numbers)
+SPANS = {
+    bt.TimeFrame.Seconds: 1.0 / 86400.0,
+    bt.TimeFrame.Minutes: 1.0 / 1440.0,
+    bt.TimeFrame.Days: 1.0,
+}
+
+# Bar bounds are datetime +- bar length, which can be a few ulps (~10
+# microseconds) off the datetime of the trade at that time. Moving them
+# by this much (under 0.1 ms) puts such a trade on the right side.
+EPSILON = 1e-9
+
+# Order types resting in the book: they pay the maker fee
+MAKER = (bt.Order.Limit, bt.Order.StopLimit, bt.Order.StopTrailLimit)
+
+
+class IntrabarIndex(object):
+    '''
+    Trades (or lower timeframe bars) below the bars of a data feed, sorted
+    by time, with prefix sums of volume and price * volume.
+
+    Any time window is found with two binary searches and the volume
+    weighted price of taking any quantity from it with one more, so a fill
+    costs O(log n) whatever the size of the window.
+    '''
+    def __init__(self, dts, prices, volumes):
+        self.dts = np.asarray(dts, dtype=np.float64)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        volumes = np.asarray(volumes, dtype=np.float64)
+
+        self.cumvol = np.concatenate(([0.0], np.cumsum(volumes)))
+        self.cumpv = np.concatenate(([0.0], np.cumsum(self.prices * volumes)))
+
+    @classmethod
+    def fromcsv(cls, dataname, price=4, volume=5, datetime=0,
+                separator=',', headers=True):
+        '''
+        Reads a binance format file: a file of minute bars (``price`` the
+        close column) or of trades (``date,price,volume``, ``price=1,
+        volume=2``)
+        '''
+        with open(dataname, 'r') as f:
+            if headers:
+                f.readline()
+            columns = fastdt.readcolumns(f, separator, dataname)
+
+        return cls(fastdt.dtnums(columns[datetime]),
+                   fastdt.floats(columns[price]),
+                   fastdt.floats(columns[volume], 0.0))
+
+    def window(self, start, end, side='left'):
+        '''
+        Index bounds of the trades in [start, end), or in (start, end] with
+        ``side='right'``
+        '''
+        return (int(np.searchsorted(self.dts, start, side)),
+                int(np.searchsorted(self.dts, end, side)))
+
+    def volume(self, lo, hi):
+        return self.cumvol[hi] - self.cumvol[lo]
+
+    def vwap(self, lo, volume):
+        '''
+        Volume weighted price of the first ``volume`` traded from trade
+        ``lo`` on, the last trade taken partially
+        '''
+        cumvol, cumpv = self.cumvol, self.cumpv
+        target = cumvol[lo] + volume
+        # first k with cumvol[k] >= target: trades lo .. k - 1
+        k = int(np.searchsorted(cumvol, target, 'left'))
+        k = min(max(k, lo + 1), len(self.prices))
+        pv = cumpv[k - 1] - cumpv[lo] + (target - cumvol[k - 1]) * \
+            self.prices[k - 1]
+        return pv / volume
+
+
+class MakerTakerCommInfo(bt.CommInfoBase):
+    '''
+    Percentage commission with different maker and taker rates.
+    IntrabarBroker sets ``taker`` before every execution.
+    '''
+    params = (
+        ('stocklike', True),
+        ('commtype', bt.CommInfoBase.COMM_PERC),
+        ('percabs', True),
+        ('maker', 0.0008),
+        ('taker', 0.001),
+    )
+
+    taker = True
+
+    def _getcommission(self, size, price, pseudoexec):
+        rate = self.p.taker if self.taker else self.p.maker
+        return abs(size) * price * rate
+
+
+class IntrabarBroker(bt.brokers.BackBroker):
+    '''
+    BackBroker filling orders against the trades inside the bar:
+
+      - an order takes at most ``participation`` of the volume traded in
+        the bar, the rest stays pending (partial fill) for the next bars
+      - market orders pay the volume weighted price of the trades they
+        take, from the open on, plus half the ``spread`` and an
+        ``impact`` proportional to their share of the bar volume
+      - with a MakerTakerCommInfo, limit orders pay the maker fee and
+        the rest the taker fee
+
+    The trades come from an IntrabarIndex given per data with
+    ``addintrabar``. Without one, the bar itself is the only trade: its
+    open and its volume.
+
+    Bars are [datetime, datetime + bar length) unless ``closetime``: then
+    (datetime - bar length, datetime], e.g. resampled data, stamped with
+    the end of the bar and holding the lower timeframe bars up to and
+    including that time.
+    '''
+    params = (
+        ('participation', 0.1),
+        ('spread', 0.0),
+        ('impact', 0.0),
+        ('closetime', False),
+    )
+
+    def init(self):
+        if not 0.0 < self.p.participation <= 1.0:
+            raise ValueError('participation must be in (0, 1], not %r' %
+                             (self.p.participation,))
+
+        super(IntrabarBroker, self).init()
+        if not hasattr(self, 'intrabar'):
+            self.intrabar = dict()
+        self._available = None
+        self.p.filler = self._filler
+
+    def addintrabar(self, data, index):
+        self.intrabar[data] = index
+
+    def _window(self, data):
+        # Trades index and bounds of the current bar of ``data``
+        index = self.intrabar.get(data)
+        if index is None:
+            return None, 0, 0
+
+        span = SPANS.get(data._timeframe, 0.0) * data._compression
+        dt = data.datetime[0]
+        if self.p.closetime:
+            return (index,) + index.window(dt - span + EPSILON, dt + EPSILON,
+                                           'right')
+        return (index,) + index.window(dt - EPSILON, dt + span - EPSILON)
+
+    def _filler(self, order, price, ago):
+        size = abs(order.executed.remsize)
+        if self._available is None:
+            return size
+        return min(size, self._available)
+
+    def _try_exec(self, order):
+        data = order.data
+        index, lo, hi = self._window(data)
+        if index is None:
+            volume = data.volume[0]
+        else:
+            volume = index.volume(lo, hi)
+
+        # what the order can take in this bar
+        self._available = volume * self.p.participation
+        self._bar = (index, lo, volume)
+
+        comminfo = self.getcommissioninfo(data)
+        comminfo.taker = order.exectype not in MAKER
+        try:
+            super(IntrabarBroker, self)._try_exec(order)
+        finally:
+            self._available = None
+            comminfo.taker = True
+
+    def _try_exec_market(self, order, popen, phigh, plow):
+        if self.p.coc and order.info.get('coc', True):
+            return super(IntrabarBroker, self)._try_exec_market(
+                order, popen, phigh, plow)
+
+        if order.data.datetime[0] <= order.created.dt:
+            return  # can only execute after creation time
+
+        size = min(abs(order.executed.remsize), self._available)
+        if size <= 0.0:
+            return  # nothing traded in the bar
+
+        index, lo, volume = self._bar
+        if index is None:
+            price = popen
+        else:
+            # the order is at most participation of every trade it meets
+            price = index.vwap(lo, size / self.p.participation)
+
+        cost = self.p.spread / 2.0 + self.p.impact * size / volume
+        price *= (1.0 + cost) if order.isbuy() else (1.0 - cost)
+
+        # Never outside the range of the bar
+        price = min(max(price, plow), phigh)
+        self._execute(order, ago=0, price=price)
+
+
+class FillStats(bt.Analyzer):
+    '''Fills, partial fills, commissions and slippage against the open'''
+    def start(self):
+        self.fills = 0
+        self.partials = 0
+        self.comm = 0.0
+        self.slippage = 0.0
+
+    def notify_order(self, order):
+        if order.status not in (order.Partial, order.Completed):
+            return
+
+        bit = order.executed.exbits[-1]
+        popen = order.data.open[0]
+        sign = 1.0 if order.isbuy() else -1.0
+
+        self.fills += 1
+        self.partials += order.status == order.Partial
+        self.comm += bit.comm
+        # paid above (buys) or below (sells) the open, in basis points
+        self.slippage += sign * (bit.price / popen - 1.0) * 10000.0
+
+    def get_analysis(self):
+        return dict(
+            fills=self.fills,
+            partials=self.partials,
+            comm=self.comm,
+            slippage_bps=self.slippage / self.fills if self.fills else 0.0,
+        )
+
+
+def run(dataname, intrabar, compression, fromdate, todate, realistic,
+        **brokerkw):
+    '''
+    Dual EMA example on ``compression`` minute bars resampled from
+    ``dataname``, with the default broker or (``realistic``) with an
+    IntrabarBroker on the trades of ``intrabar``
+    '''
+    import runner
+    from dual_ema_example import EMAStrategy
+
+    cerebro = bt.Cerebro()
+    data = FastCSVData(
+        dataname=dataname,
+        fromdate=fromdate,
+        todate=todate,
+        dtformat=fastdt.BINANCE_DTFORMAT,
+        timeframe=bt.TimeFrame.Minutes,
+        datetime=0, open=1, high=2, low=3, close=4, volume=5,
+        openinterest=-1)
+    data = cerebro.resampledata(data, timeframe=bt.TimeFrame.Minutes,
+                                compression=compression)
+
+    if realistic:
+        cerebro.broker = IntrabarBroker(closetime=True, **brokerkw)
+        cerebro.broker.addintrabar(data, IntrabarIndex.fromcsv(intrabar))
+        cerebro.broker.addcommissioninfo(MakerTakerCommInfo())
+    else:
+        cerebro.broker.setcommission(commission=0.001)
+
+    cerebro.addstrategy(EMAStrategy)
+    cerebro.addsizer(bt.sizers.PercentSizer, percents=99)
+    cerebro.broker.setcash(0.50)
+    cerebro.addanalyzer(FillStats, _name='fills')
+
+    with runner.quiet():
+        strat = cerebro.run()[0]
+
+    return cerebro.broker.getvalue(), strat.analyzers.fills.get_analysis()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Dual EMA with fills at the open and with intrabar fills')
+
+    parser.add_argument('--data', default='binance.csv',
+                        help='Binance format minute bars')
+    parser.add_argument('--intrabar', default=None,
+                        help='Trades or lower timeframe bars (default: '
+                             'the minute bars of --data)')
+    parser.add_argument('--compression', type=int, default=15,
+                        help='Minutes of the bars the strategy runs on')
+    parser.add_argument('--fromdate', default=None, help='YYYY-MM-DD')
+    parser.add_argument('--todate', default=None, help='YYYY-MM-DD')
+    parser.add_argument('--participation', type=float, default=0.1)
+    parser.add_argument('--spread', type=float, default=0.0005)
+    parser.add_argument('--impact', type=float, default=0.001)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fromdate = todate = None
+    if args.fromdate:
+        fromdate = datetime.strptime(args.fromdate, '%Y-%m-%d')
+    if args.todate:
+        todate = datetime.strptime(args.todate, '%Y-%m-%d')
+
+    for title, realistic in (('Fills at the open', False),
+                             ('Intrabar fills', True)):
+        value, stats = run(args.data, args.intrabar or args.data,
+                           args.compression, fromdate, todate, realistic,
+                           participation=args.participation,
+                           spread=args.spread, impact=args.impact)
+        print('{}: value {:.8f}, fills {}, partial {}, comm {:.8f}, '
+              'slippage {:.2f} bps'.format(
+                  title, value, stats['fills'], stats['partials'],
+                  stats['comm'], stats['slippage_bps']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import itertools
+import math
+from fractions import Fraction
+
+import backtrader as bt
+
+
+def _exact(x):
+    # The decimal number as written (0.1 -> 1/10, not the float 0.1). Only
+    # for params and cash amounts: fills go through _steps
+    return Fraction(repr(x)) if isinstance(x, float) else Fraction(x)
+
+
+def _steps(value, step):
+    '''
+    ``value`` in whole ``step`` (a float), rounded towards zero. A quotient
+    a few ulps from an integer is that integer: 0.003 / 0.001 is
+    2.9999999999999996 in floats but 3 lots
+    '''
+    q = value / step
+    n = round(q)
+    if abs(q - n) <= 1e-9 * max(1.0, abs(q)):
+        return int(n)
+    return int(q)
+
+
+def _gcd(a, b):
+    # Greatest common divisor of two fractions
+    return Fraction(math.gcd(a.numerator * b.denominator,
+                             b.numerator * a.denominator),
+                    a.denominator * b.denominator)
+
+
+class FixedPointBroker(bt.brokers.BackBroker):
+    '''
+    BackBroker keeping cash and positions in integers, following the rules
+    of a spot exchange:
+
+      - ``tick``: prices are rounded to a multiple of it
+      - ``lot``: sizes are multiples of it (orders are rounded down)
+      - ``minqty`` / ``minnotional``: smaller orders are rejected, like the
+        LOT_SIZE and MIN_NOTIONAL filters of an exchange
+      - ``precision``: decimals of the quote asset, commissions are rounded
+        to it
+
+    Every fill is accounted exactly in integer units of the ledger (the
+    largest unit dividing lot * tick and the quote precision) and the float
+    ``cash`` and position sizes seen by the strategy are recomputed from
+    the integers, so nothing accumulates float rounding errors however
+    many trades the run has. There is no per bar cost: only fills do
+    integer arithmetic: prices and sizes are turned into ticks and lots
+    with one float division each, the rest is integer math.
+
+    Only for stocklike (spot) commission schemes without leverage.
+    '''
+    params = (
+        ('tick', 0.00000001),
+        ('lot', 0.00000001),
+        ('minqty', 0.0),
+        ('minnotional', 0.0),
+        ('precision', 8),
+    )
+
+    def init(self):
+        self.tick = _exact(self.p.tick)
+        self.lot = _exact(self.p.lot)
+        self.minqty = _exact(self.p.minqty)
+        self.minnotional = _exact(self.p.minnotional)
+        self.cashstep = Fraction(1, 10 ** self.p.precision)
+
+        # ledger unit and its size in lot * tick (notional) and cash steps
+        self.unit = _gcd(self.lot * self.tick, self.cashstep)
+        self.notionalunits = int(self.lot * self.tick / self.unit)
+        self.cashunits = int(self.cashstep / self.unit)
+
+        # for the float to ticks / lots conversions of every order and fill
+        self.ftick = float(self.tick)
+        self.flot = float(self.lot)
+        self.minlots = self.minqty / self.lot
+        self.minnotionalunits = self.minnotional / self.unit
+        self._rates = dict()
+
+        super(FixedPointBroker, self).init()
+        self.icash = self.tounits(self.p.cash)
+        self.ilots = dict()
+
+    def setcash(self, cash):
+        super(FixedPointBroker, self).setcash(cash)
+        self.icash = self.tounits(cash)
+
+    def tounits(self, amount):
+        '''``amount`` of cash in ledger units, rounded to the precision'''
+        steps = round(_exact(amount) / self.cashstep)
+        return steps * self.cashunits
+
+    def fromunits(self, units):
+        return units / self.unit.denominator * self.unit.numerator
+
+    def getcashunits(self):
+        return self.icash
+
+    def ticks(self, price):
+        '''``price`` in ticks, rounded to the nearest'''
+        return round(price / self.ftick)
+
+    def roundprice(self, price):
+        return float(self.ticks(price) * self.tick)
+
+    def lots(self, size):
+        '''``size`` in lots, rounded towards zero'''
+        return _steps(size, self.flot)
+
+    def lotsfor(self, percents, price):
+        '''Lots bought with ``percents`` of the cash at ``price``'''
+        budget = Fraction(self.icash * _exact(percents), 100)
+        ticks = self.ticks(price)
+        if ticks <= 0:
+            return 0
+        return math.floor(budget / (ticks * self.notionalunits))
+
+    def _allowed(self, order):
+        lots = abs(self.lots(order.size))
+        if not lots or lots < self.minlots:
+            return False
+
+        ticks = self.ticks(order.created.price or order.data.close[0])
+        return lots * ticks * self.notionalunits >= self.minnotionalunits
+
+    def buy(self, owner, data, size, *args, **kwargs):
+        size = float(self.lots(size) * self.lot)
+        return super(FixedPointBroker, self).buy(owner, data, size,
+                                                 *args, **kwargs)
+
+    def sell(self, owner, data, size, *args, **kwargs):
+        size = float(self.lots(size) * self.lot)
+        return super(FixedPointBroker, self).sell(owner, data, size,
+                                                  *args, **kwargs)
+
+    def submit(self, order, check=True):
+        pref = getattr(order.parent, 'ref', order.ref)
+        if not order.transmit or (pref != order.ref and
+                                  pref not in self._pchildren):
+            # kept until its group is transmitted, or rejected (parent gone)
+            return super(FixedPointBroker, self).submit(order, check=check)
+
+        # The exchange refuses the group at once if any order breaks a rule
+        group = list(self._pchildren.get(pref, ())) + [order]
+        refused = next((o for o in group if not self._allowed(o)), None)
+        if refused is None:
+            return super(FixedPointBroker, self).submit(order, check=check)
+
+        self._pchildren[pref].append(order)
+        self._refuse(refused)
+        for o in group:
+            if o is not refused:
+                # never sent: rejected as children of a refused parent are
+                o.reject(self)
+                self.notify(o)
+
+        return order
+
+    def _refuse(self, order):
+        # As BackBroker refuses an order for margin (check_submitted), with
+        # a rejection. _ococheck only cancels the pending oco orders: the
+        # ones still waiting for check_submitted are cancelled here, and
+        # all leave their bracket queue as if cancelled by the strategy
+        order.reject(self)
+        self.notify(order)
+
+        ocol = self._ocol.get(self._ocos.get(self._ocos.get(order.ref)), ())
+        others = [o for o in itertools.chain(self.submitted, self.pending)
+                  if o is not None and o.ref in ocol]
+        for o in others:
+            if o in self.submitted:
+                self.submitted.remove(o)
+                o.cancel()
+                self.notify(o)
+
+        self._ococheck(order)
+        for o in others:
+            self._bracketize(o, cancel=True)
+        self._bracketize(order, cancel=True)
+
+    def _rate(self, comminfo):
+        rate = self._rates.get(comminfo)
+        if rate is None:
+            rate = self._rates[comminfo] = _exact(comminfo.p.commission)
+        return rate
+
+    def _commission(self, comminfo, lots, ticks):
+        # In ledger units, rounded to the precision of the quote asset
+        if comminfo._commtype == bt.CommInfoBase.COMM_PERC:
+            comm = (abs(lots * ticks) * self.lot * self.tick *
+                    self._rate(comminfo))
+        else:
+            comm = abs(lots) * self.lot * self._rate(comminfo)
+
+        return round(comm / self.cashstep) * self.cashunits
+
+    def _execute(self, order, ago=None, price=None, cash=None, position=None,
+                 dtcoc=None):
+        if price is not None:
+            price = self.roundprice(price)
+
+        if ago is None:
+            # pseudo execution to check the cash of submitted orders
+            return super(FixedPointBroker, self)._execute(
+                order, ago=ago, price=price, cash=cash, position=position,
+                dtcoc=dtcoc)
+
+        nbits = len(order.executed.exbits)
+        super(FixedPointBroker, self)._execute(
+            order, ago=ago, price=price, cash=cash, position=position,
+            dtcoc=dtcoc)
+        if len(order.executed.exbits) == nbits:
+            return  # not executed
+
+        comminfo = self.getcommissioninfo(order.data)
+        if not comminfo.stocklike or comminfo.get_leverage() != 1.0:
+            raise ValueError('FixedPointBroker only supports spot trading')
+
+        bit = order.executed.exbits[-1]
+        lots = self.lots(bit.size)
+        ticks = self.ticks(bit.price)
+
+        notional = lots * ticks * self.notionalunits
+        self.icash -= notional + self._commission(comminfo, lots, ticks)
+
+        data = order.data
+        self.ilots[data] = self.ilots.get(data, 0) + lots
+
+        # What the strategy sees, recomputed from the exact ledger
+        self.cash = self.fromunits(self.icash)
+        self.positions[data].size = float(self.ilots[data] * self.lot)
+
+
+class LotSizer(bt.Sizer):
+    '''
+    PercentSizer for FixedPointBroker: buys ``percents`` of the cash
+    rounded down to whole lots and sells the full position
+    '''
+    params = (
+        ('percents', 20),
+    )
+
+    def _getsizing(self, comminfo, cash, data, isbuy):
+        position = self.broker.getposition(data)
+        if position:
+            return position.size
+
+        lots = self.broker.lotsfor(self.p.percents, data.close[0])
+        return float(lots * self.broker.lot)
+
+
+def drift(dataname, fixedpoint):
+    '''
+    Runs the dual EMA example with the float broker and PercentSizer and
+    with FixedPointBroker and LotSizer, returns both brokers
+    '''
+    import runner
+
+    base = dict(
+        strategy='dual_ema_example:EMAStrategy',
+        data=dict(dataname=dataname),
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+    )
+    results = []
+    for fixed in (False, True):
+        config = runner.merge(base)
+        if fixed:
+            config['broker']['fixedpoint'] = fixedpoint
+            config['sizer'] = dict(name='fixedpoint:LotSizer', percents=99)
+
+        cerebro = runner.makecerebro(config)
+        with runner.quiet():
+            cerebro.run()
+        results.append(cerebro.broker)
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare the float and the fixed point broker on the '
+                    'dual EMA example')
+
+    parser.add_argument('--data', default='binance.csv',
+                        help='Binance format data file')
+    parser.add_argument('--tick', type=float, default=0.00000001)
+    parser.add_argument('--lot', type=float, default=0.001)
+    parser.add_argument('--minnotional', type=float, default=0.0)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fixedpoint = dict(tick=args.tick, lot=args.lot,
+                      minnotional=args.minnotional)
+    floatbroker, fixedbroker = drift(args.data, fixedpoint)
+
+    print('Float broker cash: %.8f' % floatbroker.getcash())
+    print('Fixed point broker cash: %.8f' % fixedbroker.getcash())
+    print('Fixed point ledger: {} units of {}'.format(
+        fixedbroker.getcashunits(), fixedbroker.unit))
+    print('Final Portfolio Value (float): %.8f' % floatbroker.getvalue())
+    print('Final Portfolio Value (fixed point): %.8f' %
+          fixedbroker.getvalue())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Bars simulated at once. Fixed so that the output only depends on the
+# seed, and memory does not grow with --bars
+BLOCK = 65536
+
+# Two regimes, calm and volatile: per bar drift and volatility of the log
+# price, and probability of switching to the other regime on each bar
+REGIMES = dict(
+    drift=(0.000002, -0.000004),
+    sigma=(0.0008, 0.0025),
+    switch=(0.0005, 0.002),
+)
+
+# Per bar probability of a missing bar and of a price jump (with its size)
+GAPS = dict(
+    missing=0.001,
+    jump=0.0002,
+    jumpsigma=0.02,
+)
+
+HEADERS = dict(
+    binance='date,open,high,low,close,volume\n',
+    yahoo='Date,Open,High,Low,Close,Adj Close,Volume\n',
+)
+
+
+class Generator(object):
+    '''
+    Seeded regime-switching GBM with gaps and volume.
+
+    ``blocks`` yields the bars BLOCK at a time as numpy arrays, keeping
+    only the last price and regime between blocks.
+    '''
+    def __init__(self, seed=0, price=0.05, regimes=REGIMES, gaps=GAPS,
+                 scale=1.0):
+        self.rng = np.random.RandomState(seed)
+        self.price = price
+        self.regime = 0
+        self.drift = np.array(regimes['drift']) * scale
+        self.sigma = np.array(regimes['sigma']) * np.sqrt(scale)
+        self.switch = np.array(regimes['switch'])
+        self.gaps = gaps
+
+    def block(self, size):
+        rng = self.rng
+
+        # Regime of every bar: flips where a switch is drawn
+        flips = rng.random_sample(size) < self.switch[self.regime]
+        regime = (self.regime + np.cumsum(flips)) % 2
+        self.regime = regime[-1]
+
+        sigma = self.sigma[regime]
+        returns = self.drift[regime] + sigma * rng.standard_normal(size)
+
+        jumps = rng.random_sample(size) < self.gaps['jump']
+        jumpsize = self.gaps['jumpsigma'] * rng.standard_normal(size)
+        opengap = np.where(jumps, jumpsize, 0.0)
+
+        logclose = np.log(self.price) + np.cumsum(opengap + returns)
+        close = np.exp(logclose)
+        opn = np.exp(logclose - returns)
+        self.price = close[-1]
+
+        wicks = sigma * np.abs(rng.standard_normal((2, size)))
+        high = np.maximum(opn, close) * np.exp(wicks[0])
+        low = np.minimum(opn, close) * np.exp(-wicks[1])
+
+        # More volume on volatile bars
+        volume = rng.lognormal(3.0, 1.0, size) * (1.0 + np.abs(returns) /
+                                                  sigma)
+
+        present = rng.random_sample(size) >= self.gaps['missing']
+        return present, opn, high, low, close, volume
+
+    def blocks(self, bars):
+        for start in range(0, bars, BLOCK):
+            # Always simulate a full block: a shorter run is then exactly
+            # the beginning of a longer one with the same seed
+            size = min(BLOCK, bars - start)
+            yield tuple(x[:size] for x in self.block(BLOCK))
+
+
+def _binance_rows(start, index, opn, high, low, close, volume):
+    # Day strings change once per 1440 bars, reuse them
+    days = {}
+    rows = []
+    for i, o, h, l, c, v in zip(index, opn, high, low, close, volume):
+        day, minute = divmod(int(i), 1440)
+        daystr = days.get(day)
+        if daystr is None:
+            daystr = days[day] = (start + timedelta(days=day)).strftime(
+                '%d/%m/%Y')
+        rows.append('%s %02d:%02d:00,%.8f,%.8f,%.8f,%.8f,%.4f\n' % (
+            daystr, minute // 60, minute % 60, o, h, l, c, v))
+
+    return rows
+
+
+def _yahoo_rows(start, index, opn, high, low, close, volume):
+    # Weekdays only: 5 trading days per calendar week. Bar 0 is on start
+    # (the next monday if it is a weekend day), counted from its monday
+    if start.weekday() > 4:
+        start += timedelta(days=7 - start.weekday())
+    monday = start - timedelta(days=start.weekday())
+    rows = []
+    for i, o, h, l, c, v in zip(index, opn, high, low, close, volume):
+        week, day = divmod(int(i) + start.weekday(), 5)
+        date = monday + timedelta(days=7 * week + day)
+        rows.append('%s,%.6f,%.6f,%.6f,%.6f,%.6f,%d\n' % (
+            date.strftime('%Y-%m-%d'), o, h, l, c, c, v))
+
+    return rows
+
+
+def generate(output, bars, fmt='binance', seed=0, start=None, price=None):
+    '''
+    Writes ``bars`` bars (minus the simulated missing ones) to ``output``:
+    minute bars in the binance GenericCSVData format or daily bars in the
+    Yahoo CSV format. Returns the number of rows written.
+    '''
+    if fmt == 'binance':
+        start = start or datetime(2017, 7, 17)
+        price = price or 0.05
+        gen = Generator(seed, price)
+        makerows = _binance_rows
+    elif fmt == 'yahoo':
+        start = start or datetime(1995, 1, 2)
+        price = price or 30.0
+        # daily bars: drift and volatility of ~390 minutes
+        gen = Generator(seed, price, scale=390.0)
+        makerows = _yahoo_rows
+    else:
+        raise ValueError('Unknown format: %s' % fmt)
+
+    written = 0
+    offset = 0
+    with open(output, 'w') as f:
+        f.write(HEADERS[fmt])
+        for present, opn, high, low, close, volume in gen.blocks(bars):
+            index = np.arange(offset, offset + len(present))[present]
+            offset += len(present)
+            rows = makerows(start, index, opn[present], high[present],
+                            low[present], close[present], volume[present])
+            f.writelines(rows)
+            written += len(rows)
+
+    return written
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Write deterministic synthetic market data')
+
+    parser.add_argument('--output', default='binance.csv',
+                        help='File to write')
+    parser.add_argument('--bars', type=int, default=100000,
+                        help='Bars to simulate (some are left out as gaps)')
+    parser.add_argument('--format', default='binance',
+                        choices=['binance', 'yahoo'],
+                        help='binance: minute bars, yahoo: daily bars')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default=None,
+                        help='First bar date in YYYY-MM-DD format')
+    parser.add_argument('--price', type=float, default=None,
+                        help='Initial price')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    start = None
+    if args.start:
+        start = datetime.strptime(args.start, '%Y-%m-%d')
+
+    written = generate(args.output, args.bars, args.format, args.seed,
+                       start, args.price)
+    print('{} bars written to {}'.format(written, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import importlib.abc
+import importlib.util
+import multiprocessing
+import os
+import re
+import runpy
+import shlex
+import subprocess
+import sys
+import time
+import traceback
+
+# Only loaded (on first attribute access) if a run really uses them
+LAZY_MODULES = ('matplotlib', 'pandas')
+
+# Directory of the scripts, so that they can be imported by name
+MODPATH = os.path.dirname(os.path.abspath(__file__))
+
+# Imported by the launcher before forking, shared by all the runs
+PRELOAD_MODULES = ('numpy', 'backtrader', 'fastdt', 'runner', 'triggers')
+
+
+class LazyFinder(importlib.abc.MetaPathFinder):
+    '''
+    Wraps the loader of the given top-level modules in a LazyLoader, so
+    ``import matplotlib`` returns at once and the module is executed only
+    when one of its attributes is used.
+    '''
+    def __init__(self, names):
+        self.names = set(names)
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in self.names:
+            return None
+
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None and spec.loader is not None:
+                spec.loader = importlib.util.LazyLoader(spec.loader)
+                return spec
+
+        return None
+
+
+def install_lazy(names=LAZY_MODULES):
+    if not any(isinstance(f, LazyFinder) for f in sys.meta_path):
+        sys.meta_path.insert(0, LazyFinder(names))
+
+
+def preload(names=PRELOAD_MODULES):
+    install_lazy()
+    for name in names:
+        __import__(name)
+
+
+def _runjob(job):
+    script, args = job[0], list(job[1:])
+    sys.argv = [script] + args
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        # as the interpreter does: a message is printed and exits with 1
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    return 0
+
+
+def run_jobs(jobs, workers=None):
+    '''
+    Runs every job (``[script, arg, ...]``) in its own forked child, at most
+    ``workers`` at a time. Returns the exit codes.
+    '''
+    preload()
+    ctx = multiprocessing.get_context('fork')
+    # maxtasksperchild=1: a fresh child per run, no state leaks between runs
+    with ctx.Pool(workers, maxtasksperchild=1) as pool:
+        return pool.map(_runjob, jobs, chunksize=1)
+
+
+def read_jobs(path):
+    '''One job per line: script and its arguments. # starts a comment'''
+    jobs = []
+    with open(path) as f:
+        for line in f:
+            job = shlex.split(line, comments=True)
+            if job:
+                jobs.append(job)
+
+    return jobs
+
+
+def importtime(module):
+    '''
+    Imports ``module`` in a fresh interpreter with ``-X importtime`` and
+    returns a list of (cumulative usecs, self usecs, module name)
+    '''
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stderr=subprocess.PIPE, universal_newlines=True, cwd=MODPATH)
+
+    regex = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+    times = []
+    for line in proc.stderr.splitlines():
+        m = regex.match(line)
+        if m:
+            times.append((int(m.group(2)), int(m.group(1)), m.group(4)))
+
+    return times
+
+
+def printImportTime(module, top=20):
+    times = importtime(module)
+    total = sum(selftime for _, selftime, _ in times)
+    names = set(name for _, _, name in times)
+
+    print('Import of {}: {:.1f} ms, {} modules'.format(
+        module, total / 1000.0, len(times)))
+    for name in LAZY_MODULES:
+        print('{} imported: {}'.format(name, name in names))
+
+    print('{:>12} {:>12}  {}'.format('cumulative', 'self', 'module'))
+    for cumulative, selftime, name in sorted(times, reverse=True)[:top]:
+        print('{:12.1f} {:12.1f}  {}'.format(
+            cumulative / 1000.0, selftime / 1000.0, name))
+
+
+def _loadscript(path):
+    # Everything a run does before its main(): imports and definitions
+    runpy.run_path(path, run_name='__launch__')
+
+
+def startup(script, repeat=10):
+    '''
+    Average seconds to get ``script`` (a path or a module name next to
+    the launcher) loaded, without running its main, in a cold interpreter
+    and in a child forked from a launcher preloaded like run_jobs
+    '''
+    path = script
+    if not os.path.exists(path):
+        path = os.path.join(MODPATH, script + '.py')
+    path = os.path.abspath(path)
+
+    code = 'import runpy; runpy.run_path(%r, run_name="__launch__")' % path
+    start = time.perf_counter()
+    for i in range(repeat):
+        subprocess.check_call([sys.executable, '-c', code], cwd=MODPATH)
+    cold = (time.perf_counter() - start) / repeat
+
+    preload()
+    ctx = multiprocessing.get_context('fork')
+    start = time.perf_counter()
+    for i in range(repeat):
+        proc = ctx.Process(target=_loadscript, args=(path,))
+        proc.start()
+        proc.join()
+    forked = (time.perf_counter() - start) / repeat
+
+    return cold, forked
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run backtrader scripts in forked, preloaded children')
+
+    parser.add_argument('--jobs', default=None,
+                        help='File with one "script args" job per line')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Concurrent runs (default: all cpus)')
+    parser.add_argument('--importtime', default=None, metavar='MODULE',
+                        help='Report the import time of MODULE')
+    parser.add_argument('--startup', default=None, metavar='SCRIPT',
+                        help='Compare cold and forked startup of SCRIPT')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Runs to average in --startup')
+    parser.add_argument('script', nargs=argparse.REMAINDER,
+                        help='Script to run and its arguments')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.importtime:
+        printImportTime(args.importtime)
+        return
+
+    if args.startup:
+        cold, forked = startup(args.startup, args.repeat)
+        print('Cold start: {:.1f} ms'.format(cold * 1000.0))
+        print('Forked start: {:.1f} ms'.format(forked * 1000.0))
+        return
+
+    jobs = read_jobs(args.jobs) if args.jobs else []
+    if args.script:
+        jobs.append(args.script)
+
+    if not jobs:
+        sys.exit('Nothing to run')
+
+    codes = run_jobs(jobs, args.workers)
+    failed = sum(1 for code in codes if code)
+    if failed:
+        sys.exit('{} of {} runs failed'.format(failed, len(codes)))
+
+
+if __name__ == '__main__':
+    main()
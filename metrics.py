@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import backtrader as bt
+
+# date2num of 1970-01-01: converts backtrader date numbers to epoch seconds
+EPOCH = 719163.0
+
+# name -> (prometheus type, help) of every exported metric, in output order
+METRICS = (
+    ('bars', 'counter', 'Bars processed'),
+    ('bars_per_second', 'gauge', 'Bars processed per second of run'),
+    ('orders_created', 'counter', 'Orders created'),
+    ('orders_filled', 'counter', 'Orders completely filled'),
+    ('orders_partial', 'counter', 'Partial fill notifications'),
+    ('orders_canceled', 'counter', 'Orders canceled'),
+    ('orders_margin', 'counter', 'Orders refused for lack of cash'),
+    ('orders_rejected', 'counter', 'Orders rejected by the broker'),
+    ('orders_expired', 'counter', 'Orders expired'),
+    ('indicator_seconds', 'counter', 'Time spent calculating indicators'),
+    ('lag_seconds', 'gauge', 'Wall clock minus datetime of the last bar'),
+    ('rss_bytes', 'gauge', 'Resident memory of the process'),
+    ('elapsed_seconds', 'counter', 'Time since the start of the run'),
+)
+
+# order status -> counter (orders_created counts every order once, on its
+# first notification whatever the status: without checksubmit orders go
+# straight to Accepted, and orders can be rejected before submission)
+ORDERCOUNTERS = {
+    bt.Order.Completed: 'orders_filled',
+    bt.Order.Partial: 'orders_partial',
+    bt.Order.Canceled: 'orders_canceled',
+    bt.Order.Margin: 'orders_margin',
+    bt.Order.Rejected: 'orders_rejected',
+    bt.Order.Expired: 'orders_expired',
+}
+
+
+def rss():
+    '''Current resident memory in bytes (peak where /proc is missing)'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError):
+        # ru_maxrss is in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def prometheus(values, labels=None):
+    '''``values`` in the Prometheus text exposition format'''
+    labelstr = ''
+    if labels:
+        labelstr = '{%s}' % ','.join(
+            '%s="%s"' % (k, labels[k]) for k in sorted(labels))
+
+    lines = []
+    for name, kind, helptext in METRICS:
+        metric = 'backtrader_' + name
+        lines.append('# HELP %s %s' % (metric, helptext))
+        lines.append('# TYPE %s %s' % (metric, kind))
+        lines.append('%s%s %r' % (metric, labelstr, float(values[name])))
+
+    return '\n'.join(lines) + '\n'
+
+
+def _write(path, text):
+    # Readers (node_exporter, dashboards) never see a half written file
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class RunMetrics(bt.Analyzer):
+    '''
+    Run-level counters for monitoring: bars, orders by outcome, indicator
+    time, lag of the last bar behind the wall clock and resident memory.
+
+    Every ``interval`` seconds (and at the end of the run) they are written
+    to ``path``, as Prometheus text if it ends in ``.prom`` (for the
+    node_exporter textfile collector) and as json otherwise. With ``port``
+    they are also served as Prometheus text on ``http://host:port/metrics``,
+    on the loopback interface unless ``host`` says otherwise (``''`` for all
+    interfaces).
+
+    The cost per bar is a few counter increments, memory is only read when
+    the metrics are written. Indicators are timed one bar in every
+    ``timeevery`` (the time scaled up to all the bars): two clock reads per
+    indicator on every bar cost as much as a short indicator itself in
+    ``next`` mode. ``timeevery=0`` turns indicator timing off.
+
+    ``lag_seconds`` is how far behind real time the process is: with live
+    feeds the time the bar waited to be processed, huge on replays.
+    '''
+    params = (
+        ('path', None),
+        ('interval', 10.0),
+        ('port', None),
+        ('host', '127.0.0.1'),
+        ('labels', None),
+        ('timeevery', 16),
+    )
+
+    def start(self):
+        self.counts = dict((name, 0) for name in ORDERCOUNTERS.values())
+        self.counts['orders_created'] = 0
+        self.orderrefs = set()
+        self.bars = 0
+        self.indtime = 0.0
+        self.lastdt = None
+        self.t0 = time.monotonic()
+        self.t1 = None
+        self.nextflush = self.t0 + self.p.interval
+        self.server = None
+
+        labels = dict(strategy=self.strategy.__class__.__name__)
+        labels.update(self.p.labels or {})
+        self.labels = labels
+
+        # Top level indicators time their sub-indicators too
+        if self.p.timeevery:
+            for ind in self.strategy.getindicators():
+                ind._next = self._timed(ind._next, self.p.timeevery)
+                ind._once = self._timed(ind._once)
+
+        if self.p.port is not None:
+            self.serve(self.p.port, self.p.host)
+
+    def _timed(self, method, every=1):
+        # Times one call in every ``every``, counted ``every`` times
+        clock = time.perf_counter
+        skip = 0
+
+        def timed():
+            nonlocal skip
+            if skip:
+                skip -= 1
+                method()
+                return
+
+            skip = every - 1
+            t = clock()
+            method()
+            self.indtime += (clock() - t) * every
+
+        return timed
+
+    def notify_order(self, order):
+        if order.ref not in self.orderrefs:
+            self.orderrefs.add(order.ref)
+            self.counts['orders_created'] += 1
+
+        counter = ORDERCOUNTERS.get(order.status)
+        if counter is not None:
+            self.counts[counter] += 1
+
+    def next(self):
+        self.bars += 1
+        self.lastdt = self.data.datetime[0]
+
+        if self.p.path and time.monotonic() >= self.nextflush:
+            self.flush()
+
+    def stop(self):
+        self.t1 = time.monotonic()
+        if self.p.path:
+            self.flush()
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def snapshot(self):
+        '''The current value of every metric in METRICS'''
+        elapsed = (self.t1 or time.monotonic()) - self.t0
+        lag = 0.0
+        if self.lastdt is not None:
+            lag = time.time() - (self.lastdt - EPOCH) * 86400.0
+
+        values = dict(self.counts)
+        values.update(
+            bars=self.bars,
+            bars_per_second=self.bars / elapsed if elapsed else 0.0,
+            indicator_seconds=self.indtime,
+            lag_seconds=lag,
+            rss_bytes=rss(),
+            elapsed_seconds=elapsed,
+        )
+        return values
+
+    def render(self, fmt):
+        values = self.snapshot()
+        if fmt == 'prometheus':
+            return prometheus(values, self.labels)
+
+        values['labels'] = self.labels
+        return json.dumps(values, sort_keys=True) + '\n'
+
+    def flush(self):
+        fmt = 'prometheus' if self.p.path.endswith('.prom') else 'json'
+        _write(self.p.path, self.render(fmt))
+        self.nextflush = time.monotonic() + self.p.interval
+
+    def serve(self, port, host='127.0.0.1'):
+        analyzer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = analyzer.render('prometheus').encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = HTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def get_analysis(self):
+        return self.snapshot()
+
+
+def overhead(dataname, repeat=5, mode='memory'):
+    '''
+    Best of ``repeat`` seconds of the dual EMA run without and with
+    RunMetrics (writing a json file every second). ``mode`` is the runner
+    mode: ``memory`` calculates the indicators once (runonce) and
+    ``chunked`` bar by bar (``next``), where indicator timing costs most.
+    '''
+    import runner
+
+    config = runner.merge(dict(
+        strategy='dual_ema_example:EMAStrategy',
+        data=dict(dataname=dataname),
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+        mode=mode,
+    ))
+    path = os.path.join(tempfile.gettempdir(), 'metrics.json')
+    withmetrics = dict(config, analyzers=dict(metrics=dict(
+        name='metrics:RunMetrics', path=path, interval=1.0)))
+
+    # Alternated, so that a slow spell of the machine hits both
+    times = [[], []]
+    for i in range(repeat):
+        for elapsed, cfg in zip(times, (config, withmetrics)):
+            start = time.perf_counter()
+            runner._runquiet(cfg)
+            elapsed.append(time.perf_counter() - start)
+
+    return [min(t) for t in times]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Measure the overhead of RunMetrics on the dual EMA run')
+
+    parser.add_argument('--data', default='binance.csv',
+                        help='Binance format data file')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Runs of each kind, the best is kept')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for mode in ('memory', 'chunked'):
+        plain, metered = overhead(args.data, args.repeat, mode)
+        print('Mode {}'.format(mode))
+        print('  Without metrics: {:.3f} s'.format(plain))
+        print('  With metrics: {:.3f} s'.format(metered))
+        print('  Overhead: {:.1f}%'.format((metered / plain - 1.0) * 100.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import math
+from datetime import datetime
+from multiprocessing import Pool
+
+import numpy as np
+import backtrader as bt
+
+import runner
+from dual_ema_example import EMAStrategy
+
+
+class TradeList(bt.Analyzer):
+    '''
+    Collects the return of every closed trade, in order: its net profit
+    (pnlcomm) over the portfolio value right before it opened.
+
+    With a sizer investing a share of the portfolio (PercentSizer) the
+    profit of a trade grows with the equity at the time and its return
+    does not, so the returns are what can be resampled.
+
+    The value before the trade is the cash given back the cost and the
+    commission of the opening fill, plus the positions on other datas
+    (long trades of stocklike assets).
+    '''
+    def start(self):
+        self.returns = []
+        self.entryvalue = dict()
+
+    def notify_trade(self, trade):
+        broker = self.strategy.broker
+        if trade.justopened:
+            others = sum(broker.get_value([data])
+                         for data in self.strategy.datas
+                         if data is not trade.data)
+            self.entryvalue[trade.ref] = (
+                broker.getcash() + trade.value + trade.commission + others)
+
+        if trade.isclosed:
+            value = self.entryvalue.pop(trade.ref)
+            self.returns.append(trade.pnlcomm / value)
+
+    def get_analysis(self):
+        return self.returns
+
+
+def _batch(args):
+    '''
+    Simulates ``npaths`` equity paths at once. Each row of the matrix is
+    one path, so drawdown, final value and SQN are computed with array
+    operations over the whole batch. The trade returns of a path are
+    compounded from ``startcash``.
+    '''
+    returns, startcash, npaths, method, seed = args
+    rng = np.random.RandomState(seed)
+    ntrades = len(returns)
+
+    if method == 'bootstrap':
+        idx = rng.randint(0, ntrades, size=(npaths, ntrades))
+    else:  # permutation
+        idx = np.argsort(rng.random_sample((npaths, ntrades)), axis=1)
+
+    paths = returns[idx]
+    equity = startcash * np.cumprod(1.0 + paths, axis=1)
+    # the starting cash is also a peak the path can draw down from
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), startcash)
+    drawdown = ((peak - equity) / peak).max(axis=1) * 100.0
+
+    # population standard deviation, like the SQN analyzer
+    stddev = paths.std(axis=1, ddof=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sqn = math.sqrt(ntrades) * paths.mean(axis=1) / stddev
+
+    return drawdown, equity[:, -1], sqn
+
+
+def simulate(returns, startcash, npaths=10000, method='bootstrap',
+             batchsize=1000, workers=None, seed=0):
+    '''
+    Resamples the closed trade returns ``returns`` (as collected by
+    TradeList) into ``npaths`` equity paths.
+
+    ``method`` is either ``bootstrap`` (draw trades with replacement) or
+    ``permutation`` (shuffle the order of the same trades). Batches of
+    ``batchsize`` paths are spread over a process pool of ``workers``
+    processes (all cpus if None, no pool if 1). Every batch gets its own
+    seed, so the result depends only on ``seed`` and not on ``workers``.
+
+    Returns a dict with ``drawdown`` (percent), ``value`` and ``sqn``
+    arrays of length ``npaths``.
+    '''
+    if method not in ('bootstrap', 'permutation'):
+        raise ValueError('Unknown method: %s' % method)
+
+    returns = np.asarray(returns, dtype=np.float64)
+    if len(returns) < 2:
+        raise ValueError('At least 2 closed trades are needed')
+
+    jobs = []
+    for i, start in enumerate(range(0, npaths, batchsize)):
+        size = min(batchsize, npaths - start)
+        jobs.append((returns, startcash, size, method, seed + i))
+
+    if workers == 1:
+        results = [_batch(job) for job in jobs]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(_batch, jobs)
+
+    drawdown, value, sqn = (np.concatenate(x) for x in zip(*results))
+    return dict(drawdown=drawdown, value=value, sqn=sqn)
+
+
+def printMonteCarloInfo(result, percentiles=(5, 25, 50, 75, 95)):
+    print('Paths: {}'.format(len(result['value'])))
+    header = ''.join('{:>14}'.format('P%d' % p) for p in percentiles)
+    print('{:12}{}'.format('', header))
+    for name in ('drawdown', 'value', 'sqn'):
+        values = result[name]
+        values = values[np.isfinite(values)]
+        row = ''.join('{:14.8f}'.format(x)
+                      for x in np.percentile(values, percentiles))
+        print('{:12}{}'.format(name.upper(), row))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Monte Carlo trade resampling of EMAStrategy results')
+
+    parser.add_argument('--data', default='binance.csv',
+                        help='Binance formatted csv file')
+    parser.add_argument('--fromdate', default=None,
+                        help='Starting date in YYYY-MM-DD format')
+    parser.add_argument('--todate', default=None,
+                        help='Ending date in YYYY-MM-DD format')
+    parser.add_argument('--paths', type=int, default=10000,
+                        help='Number of simulated equity paths')
+    parser.add_argument('--method', default='bootstrap',
+                        choices=['bootstrap', 'permutation'])
+    parser.add_argument('--batchsize', type=int, default=1000,
+                        help='Paths simulated at once by each worker')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: all cpus)')
+    parser.add_argument('--seed', type=int, default=0)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fromdate = todate = None
+    if args.fromdate:
+        fromdate = datetime.strptime(args.fromdate, '%Y-%m-%d')
+    if args.todate:
+        todate = datetime.strptime(args.todate, '%Y-%m-%d')
+
+    cerebro = runner.makecerebro(runner.merge(dict(
+        strategy=EMAStrategy,
+        data=dict(
+            dataname=args.data,
+            fromdate=fromdate,
+            todate=todate,
+        ),
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+        analyzers=dict(trades=TradeList),
+    )))
+
+    startcash = cerebro.broker.getvalue()
+    results = cerebro.run()
+    returns = results[0].analyzers.trades.get_analysis()
+
+    print('Final Portfolio Value: %.8f' % cerebro.broker.getvalue())
+    print('====================')
+    print('== Monte Carlo')
+    print('====================')
+    result = simulate(returns, startcash, npaths=args.paths,
+                      method=args.method, batchsize=args.batchsize,
+                      workers=args.workers, seed=args.seed)
+    printMonteCarloInfo(result)
+    print('---')
+
+
+if __name__ == '__main__':
+    main()
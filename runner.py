@@ -0,0 +1,344 @@
+import argparse
+import contextlib
+import copy
+import importlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from datetime import datetime
+
+import backtrader as bt
+
+import fastdt
+from fastdt import FastCSVData
+
+# Defaults of every configuration, see README for the keys
+DEFAULTS = dict(
+    name=None,
+    strategy=None,
+    params={},
+    data=dict(
+        dataname='binance.csv',
+        format='binance',
+        fromdate=None,
+        todate=None,
+    ),
+    broker=dict(
+        cash=10000.0,
+        commission=0.0,
+        fixedpoint=None,
+    ),
+    sizer=None,
+    analyzers={},
+    mode='memory',
+    chunksize=10000,
+    plot=False,
+)
+
+
+def load_configs(paths):
+    '''Each json file holds one configuration or a list of them'''
+    configs = []
+    for path in paths:
+        with open(path) as f:
+            loaded = json.load(f)
+        if isinstance(loaded, dict):
+            loaded = [loaded]
+        for config in loaded:
+            config.setdefault('name', path)
+            configs.append(config)
+
+    return configs
+
+
+def merge(config):
+    '''``config`` completed with the defaults'''
+    merged = copy.deepcopy(DEFAULTS)
+    for key, value in config.items():
+        if isinstance(merged.get(key), dict) and isinstance(value, dict):
+            merged[key].update(value)
+        else:
+            merged[key] = value
+
+    return merged
+
+
+def _values(value):
+    '''
+    A param value: a list is a set of values to sweep, {"range": [start,
+    stop(, step)]} a range of them, anything else a single value
+    '''
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict) and 'range' in value:
+        return list(range(*value['range']))
+    return [value]
+
+
+def expand(config):
+    '''
+    Merges ``config`` with the defaults and expands its param sweeps into
+    one configuration per combination of params
+    '''
+    config = merge(config)
+    names = sorted(config['params'])
+    grid = itertools.product(*(_values(config['params'][n]) for n in names))
+
+    runs = []
+    for values in grid:
+        run = dict(config)
+        run['params'] = dict(zip(names, values))
+        runs.append(run)
+
+    return runs
+
+
+def _getclass(ref, module=None):
+    # A class, "module:Class" / "module.Class" or a class name in ``module``
+    if not isinstance(ref, str):
+        return ref
+
+    modname, sep, clsname = ref.rpartition(':')
+    if not sep:
+        modname, sep, clsname = ref.rpartition('.')
+
+    if modname:
+        module = importlib.import_module(modname)
+
+    return getattr(module, clsname)
+
+
+def _date(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def makedata(config):
+    datacfg = config['data']
+    fromdate = _date(datacfg.get('fromdate'))
+    todate = _date(datacfg.get('todate'))
+
+    if datacfg['format'] == 'yahoo':
+        return bt.feeds.YahooFinanceCSVData(
+            dataname=datacfg['dataname'],
+            fromdate=fromdate,
+            todate=todate,
+            reverse=False)
+
+    datakwargs = dict(
+        dataname=datacfg['dataname'],
+        fromdate=fromdate,
+        todate=todate,
+
+        dtformat=("%d/%m/%Y %H:%M:%S"),
+        timeframe=bt.TimeFrame.Minutes,
+
+        datetime=0,
+        open=1,
+        high=2,
+        low=3,
+        close=4,
+        volume=5,
+        openinterest=-1
+    )
+    if config['mode'] == 'chunked':
+        from chunked_backtest import ChunkedCSVData
+        return ChunkedCSVData(chunksize=config['chunksize'], **datakwargs)
+
+    return FastCSVData(**datakwargs)
+
+
+def makecerebro(config):
+    if config['mode'] == 'chunked':
+        from chunked_backtest import make_cerebro
+        cerebro = make_cerebro(config['chunksize'])
+    else:
+        cerebro = bt.Cerebro()
+
+    if config['broker'].get('fixedpoint') is not None:
+        from fixedpoint import FixedPointBroker
+        cerebro.broker = FixedPointBroker(**config['broker']['fixedpoint'])
+
+    cerebro.addstrategy(_getclass(config['strategy']), **config['params'])
+    cerebro.adddata(makedata(config))
+
+    if config['sizer']:
+        sizercfg = dict(config['sizer'])
+        sizer = _getclass(sizercfg.pop('name'), bt.sizers)
+        cerebro.addsizer(sizer, **sizercfg)
+
+    cerebro.broker.setcash(config['broker']['cash'])
+    cerebro.broker.setcommission(commission=config['broker']['commission'])
+
+    for name, analyzer in config['analyzers'].items():
+        # A class reference or a dict with its "name" and params
+        kwargs = {}
+        if isinstance(analyzer, dict):
+            kwargs = dict(analyzer)
+            analyzer = kwargs.pop('name')
+        cerebro.addanalyzer(_getclass(analyzer, bt.analyzers), _name=name,
+                            **kwargs)
+
+    return cerebro
+
+
+def analyzerInfo(analyzer):
+    '''The figures printed by printAnalyzersInfo, as a dict'''
+    analysis = analyzer.get_analysis()
+    info = dict()
+    if isinstance(analyzer, bt.analyzers.TradeAnalyzer):
+        total_closed = analysis.total.get('closed', 0)
+        if not total_closed:
+            info['total_trade'] = 0
+            return info
+
+        info['winning_percent'] = (analysis.won.total / total_closed) * 100
+        info['total_trade'] = total_closed
+        info['profit_factor'] = (
+            analysis.won.pnl.total / analysis.lost.pnl.total
+            if analysis.lost.pnl.total else None)
+        info['net_profit'] = analysis.pnl.net.total
+        info['avg_win'] = analysis.won.pnl.average
+        info['avg_loss'] = analysis.lost.pnl.average
+        info['max_drawn'] = analysis.lost.pnl.max
+
+    if isinstance(analyzer, bt.analyzers.SQN):
+        info['sqn'] = analysis.sqn
+
+    # metrics (and http.server) is only imported by the runs using it
+    metrics = sys.modules.get('metrics')
+    if metrics is not None and isinstance(analyzer, metrics.RunMetrics):
+        info.update(analysis)
+
+    return info
+
+
+def printAnalyzersInfo(analyzer):
+    info = analyzerInfo(analyzer)
+    if isinstance(analyzer, bt.analyzers.TradeAnalyzer):
+        if not info['total_trade']:
+            print('Total Trade: 0')
+            return
+        print('Winning Percent: {:6f}'.format(info['winning_percent']))
+        print('Total Trade: {}'.format(info['total_trade']))
+        print('Profit Factor: {}'.format(info['profit_factor']))
+        print('Net Profit: {}'.format(info['net_profit']))
+        print('AVG win: {}'.format(info['avg_win']))
+        print('AVG loss: {}'.format(info['avg_loss']))
+        print('MAX DRAWN: {}'.format(info['max_drawn']))
+
+    if isinstance(analyzer, bt.analyzers.SQN):
+        sqn = round(info['sqn'],2)
+        print('SQN: {}'.format(sqn))
+
+
+def runone(config, verbose=False):
+    '''
+    Runs a single (already expanded) configuration and returns its result:
+    name, params, final value and the analyzerInfo of every analyzer
+    '''
+    cerebro = makecerebro(config)
+    if verbose:
+        print('Starting Portfolio Value: %.8f' % cerebro.broker.getvalue())
+
+    results = cerebro.run()
+    runst = results[0]
+
+    result = dict(
+        name=config['name'],
+        params=config['params'],
+        value=cerebro.broker.getvalue(),
+        analyzers=dict((name, analyzerInfo(runst.analyzers.getbyname(name)))
+                       for name in config['analyzers']),
+    )
+
+    if verbose:
+        print('Final Portfolio Value: %.8f' % result['value'])
+        if config['analyzers']:
+            print('====================')
+            print('== Analyzers')
+            print('====================')
+            for name in config['analyzers']:
+                printAnalyzersInfo(runst.analyzers.getbyname(name))
+            print('---')
+
+    if config['plot']:
+        import decimated_plot
+        decimated_plot.plot(cerebro, runst)
+
+    return result
+
+
+def run(config):
+    '''Runs every combination of ``config`` in this process, printing it'''
+    return [runone(c, verbose=True) for c in expand(config)]
+
+
+@contextlib.contextmanager
+def quiet():
+    # Strategies print as they go, keep the workers quiet
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+def _runquiet(config):
+    with quiet():
+        return runone(config)
+
+
+def run_batch(configs, workers=None):
+    '''
+    Expands ``configs`` and runs all the combinations on a process pool.
+    Every binance data file is read once here and shared with the forked
+    workers, which preload from memory.
+    '''
+    runs = [c for config in configs for c in expand(config)]
+    for run in runs:
+        run['plot'] = False
+
+    datanames = set(r['data']['dataname'] for r in runs
+                    if r['data']['format'] == 'binance' and
+                    r['mode'] == 'memory')
+    for dataname in sorted(datanames):
+        fastdt.cachefile(dataname)
+
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(workers) as pool:
+        for result in pool.imap(_runquiet, runs):
+            yield result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Run backtests described by json configuration files')
+
+    parser.add_argument('configs', nargs='+',
+                        help='Configuration files')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: all cpus)')
+    parser.add_argument('--output', default=None,
+                        help='Write one json result per line to this file')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configs = load_configs(args.configs)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in run_batch(configs, args.workers):
+            out.write(json.dumps(result, sort_keys=True) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
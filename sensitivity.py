@@ -0,0 +1,332 @@
+import argparse
+import json
+import warnings
+from array import array
+
+import numpy as np
+
+
+def _metric(result, metric):
+    # "value" or any figure of analyzerInfo, e.g. "sqn" or "profit_factor"
+    if metric in result:
+        return result[metric]
+
+    for info in result.get('analyzers', {}).values():
+        if metric in info:
+            value = info[metric]
+            if metric == 'profit_factor' and value is not None:
+                # analyzerInfo divides by the (negative) lost pnl
+                value = abs(value)
+            return value
+
+    return None
+
+
+def load_results(path, metric='value'):
+    '''
+    Reads the json lines written by ``runner.py --output`` and returns
+    (param names, {name: array of values}, metric array, fold names, fold
+    index array). A fold is the configuration ``name`` of the result, i.e.
+    one data window or symbol of the sweep.
+
+    Values are kept in flat float arrays, not in the parsed dicts.
+    '''
+    names = None
+    params = None
+    scores = array('d')
+    folds = []
+    foldidx = {}
+    foldarr = array('l')
+
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+
+            if names is None:
+                names = sorted(result['params'])
+                params = dict((name, array('d')) for name in names)
+            elif sorted(result['params']) != names:
+                raise ValueError('Results with different params: %s' %
+                                 sorted(result['params']))
+
+            for name in names:
+                params[name].append(float(result['params'][name]))
+
+            score = _metric(result, metric)
+            scores.append(np.nan if score is None else float(score))
+
+            fold = result.get('name')
+            if fold not in foldidx:
+                foldidx[fold] = len(folds)
+                folds.append(fold)
+            foldarr.append(foldidx[fold])
+
+    if names is None:
+        raise ValueError('No results in %s' % path)
+
+    params = dict((name, np.frombuffer(params[name])) for name in names)
+    return (names, params, np.frombuffer(scores), folds,
+            np.frombuffer(foldarr, dtype=np.dtype('l')))
+
+
+def grid(names, params, scores, mask=None, axes=None):
+    '''
+    Scatters the results into an n-dimensional array with one axis per
+    param (its sorted unique values, or the given ``axes``). Repeated
+    combinations are averaged, missing ones and NaN scores are NaN.
+    Returns (axes, grid).
+    '''
+    if mask is not None:
+        params = dict((name, params[name][mask]) for name in names)
+        scores = scores[mask]
+
+    if axes is None:
+        axes = [np.unique(params[name]) for name in names]
+
+    shape = tuple(len(axis) for axis in axes)
+    index = [np.searchsorted(axis, params[name])
+             for name, axis in zip(names, axes)]
+    flat = np.ravel_multi_index(index, shape)
+
+    valid = ~np.isnan(scores)
+    size = int(np.prod(shape))
+    total = np.bincount(flat[valid], weights=scores[valid], minlength=size)
+    count = np.bincount(flat[valid], minlength=size)
+
+    values = np.full(size, np.nan)
+    np.divide(total, count, out=values, where=count > 0)
+    return axes, values.reshape(shape)
+
+
+def _boxsum(values, radius, axis):
+    # Sum over [i - radius, i + radius] along axis, with cumulative sums
+    csum = np.cumsum(values, axis=axis)
+    n = values.shape[axis]
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (1, 0)
+    csum = np.pad(csum, pad, mode='constant')
+
+    hi = np.minimum(np.arange(n) + radius + 1, n)
+    lo = np.maximum(np.arange(n) - radius, 0)
+    return np.take(csum, hi, axis=axis) - np.take(csum, lo, axis=axis)
+
+
+def smooth(values, radius=1):
+    '''
+    Mean of every cell over its neighbourhood (the cells at most ``radius``
+    steps away on every axis), NaN cells left out. Linear in the size of
+    the grid whatever the radius.
+    '''
+    valid = ~np.isnan(values)
+    total = np.where(valid, values, 0.0)
+    count = valid.astype(np.float64)
+    for axis in range(values.ndim):
+        total = _boxsum(total, radius, axis)
+        count = _boxsum(count, radius, axis)
+
+    out = np.full(values.shape, np.nan)
+    np.divide(total, count, out=out, where=count > 0)
+    return out
+
+
+def worst(values, radius=1):
+    '''
+    Lowest value over the neighbourhood of every cell: the score a
+    combination still gets if the best params drift by ``radius`` steps
+    '''
+    out = values.copy()
+    for axis in range(values.ndim):
+        n = values.shape[axis]
+        shifted = out.copy()
+        for step in range(1, radius + 1):
+            if step >= n:
+                break
+            lo = [slice(None)] * values.ndim
+            hi = [slice(None)] * values.ndim
+            lo[axis] = slice(0, n - step)
+            hi[axis] = slice(step, n)
+            np.fmin(shifted[tuple(lo)], out[tuple(hi)],
+                    out=shifted[tuple(lo)])
+            np.fmin(shifted[tuple(hi)], out[tuple(lo)],
+                    out=shifted[tuple(hi)])
+        out = shifted
+
+    return out
+
+
+def best(axes, names, values, mask=None):
+    '''
+    Params and value of the best (highest, NaN ignored) cell, only among
+    the cells of ``mask`` if given. Smoothed and worst neighbour grids
+    fill cells never run: the mask of the filled cells of the raw grid
+    keeps them from being picked.
+    '''
+    if mask is not None:
+        values = np.where(mask, values, np.nan)
+
+    if np.isnan(values).all():
+        return None, np.nan
+
+    idx = np.unravel_index(np.nanargmax(values), values.shape)
+    params = dict((name, axis[i]) for name, axis, i in zip(names, axes, idx))
+    return params, values[idx]
+
+
+def surface(values, names, x, y, reduce=np.nanmax):
+    '''
+    2d view of the grid over params ``x`` (columns) and ``y`` (rows), the
+    other params reduced with ``reduce`` (the best of them by default)
+    '''
+    ix, iy = names.index(x), names.index(y)
+    others = tuple(i for i in range(len(names)) if i not in (ix, iy))
+    if others:
+        with warnings.catch_warnings():
+            # all-NaN slices are expected: missing combinations
+            warnings.simplefilter('ignore', RuntimeWarning)
+            values = reduce(values, axis=others)
+
+    # remaining axes keep their order: transpose if y comes after x
+    return values.T if iy > ix else values
+
+
+def crossvalidate(names, params, scores, folds, foldarr, radius=1):
+    '''
+    For every fold, picks the best params on the smoothed grid of all the
+    other folds and reports how they score on the held out fold. Returns a
+    list of (fold, params, train score, test score, test rank percent).
+    '''
+    axes, _ = grid(names, params, scores)
+    rows = []
+    for k, fold in enumerate(folds):
+        test = foldarr == k
+        train = ~test
+        if not train.any():
+            continue
+
+        # Same axes for both sides, whatever values each one holds
+        _, traingrid = grid(names, params, scores, train, axes)
+        _, testgrid = grid(names, params, scores, test, axes)
+
+        choice, trainscore = best(axes, names, smooth(traingrid, radius),
+                                  ~np.isnan(traingrid))
+        if choice is None:
+            continue
+
+        idx = tuple(int(np.searchsorted(axis, choice[name]))
+                    for name, axis in zip(names, axes))
+        testscore = testgrid[idx]
+        valid = testgrid[~np.isnan(testgrid)]
+        rank = (100.0 * (valid < testscore).sum() / len(valid)
+                if len(valid) and not np.isnan(testscore) else np.nan)
+        rows.append((fold, choice, trainscore, testscore, rank))
+
+    return rows
+
+
+def heatmaps(surfaces, xaxis, yaxis, x, y, metric, savefig=None):
+    '''One heatmap per (title, 2d surface), best cell marked'''
+    # matplotlib only when really plotting
+    import matplotlib.pyplot as plt
+
+    fig, axs = plt.subplots(1, len(surfaces), squeeze=False,
+                            figsize=(6 * len(surfaces), 5))
+    for ax, (title, values) in zip(axs[0], surfaces):
+        image = ax.imshow(values, origin='lower', aspect='auto',
+                          interpolation='nearest', cmap='viridis')
+        fig.colorbar(image, ax=ax, label=metric)
+
+        # At most ~10 labelled ticks per axis on big grids
+        for setticks, setlabels, axis in (
+                (ax.set_xticks, ax.set_xticklabels, xaxis),
+                (ax.set_yticks, ax.set_yticklabels, yaxis)):
+            ticks = np.arange(0, len(axis), max(1, len(axis) // 10))
+            setticks(ticks)
+            setlabels(['%g' % v for v in axis[ticks]])
+
+        if not np.isnan(values).all():
+            row, col = np.unravel_index(np.nanargmax(values), values.shape)
+            ax.plot(col, row, marker='*', color='r', markersize=12)
+
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+        ax.set_title(title)
+
+    fig.tight_layout()
+    if savefig:
+        fig.savefig(savefig)
+    else:
+        plt.show()
+
+    return fig
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Parameter sensitivity of cached sweep results')
+
+    parser.add_argument('results',
+                        help='json lines written by runner.py --output')
+    parser.add_argument('--metric', default='value',
+                        help='value or an analyzer figure: sqn, '
+                             'profit_factor, net_profit, ...')
+    parser.add_argument('--x', default=None,
+                        help='Param on the x axis (default: first param)')
+    parser.add_argument('--y', default=None,
+                        help='Param on the y axis (default: second param)')
+    parser.add_argument('--radius', type=int, default=1,
+                        help='Neighbourhood size in grid steps')
+    parser.add_argument('--plot', action='store_true',
+                        help='Show the heatmaps')
+    parser.add_argument('--savefig', default=None,
+                        help='Save the heatmaps to this file')
+
+    return parser.parse_args()
+
+
+def _paramstr(params):
+    return ', '.join('%s=%g' % (k, params[k]) for k in sorted(params))
+
+
+def main():
+    args = parse_args()
+    names, params, scores, folds, foldarr = load_results(args.results,
+                                                         args.metric)
+    axes, values = grid(names, params, scores)
+    smoothed = smooth(values, args.radius)
+    worstcase = worst(values, args.radius)
+
+    print('Results: {}, grid: {} ({} cells, {} filled)'.format(
+        len(scores), ' x '.join('%s[%d]' % (n, len(a))
+                                for n, a in zip(names, axes)),
+        values.size, int((~np.isnan(values)).sum())))
+
+    filled = ~np.isnan(values)
+    for title, surf in (('Best', values), ('Best smoothed', smoothed),
+                        ('Best worst neighbour', worstcase)):
+        choice, score = best(axes, names, surf, filled)
+        if choice is not None:
+            print('{}: {} -> {:.8f}'.format(title, _paramstr(choice), score))
+
+    if len(folds) > 1:
+        print('Cross validation over {} folds'.format(len(folds)))
+        for fold, choice, train, test, rank in crossvalidate(
+                names, params, scores, folds, foldarr, args.radius):
+            print('{}: {} train {:.8f} test {:.8f} (better than {:.1f}%)'
+                  .format(fold, _paramstr(choice), train, test, rank))
+
+    if args.plot or args.savefig:
+        if len(names) < 2:
+            raise SystemExit('Heatmaps need at least 2 params')
+        x = args.x or names[0]
+        y = args.y or names[1]
+        surfaces = [(title, surface(v, names, x, y)) for title, v in (
+            ('raw', values), ('smoothed', smoothed),
+            ('worst neighbour', worstcase))]
+        heatmaps(surfaces, axes[names.index(x)], axes[names.index(y)],
+                 x, y, args.metric, args.savefig)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+import pytest
+
+from chunked_backtest import compare
+
+
+@pytest.mark.parametrize('chunksize', [1, 7, 100000])
+def test_chunked_identical_to_memory(datafile, chunksize):
+    with open(datafile) as f:
+        rows = sum(1 for line in f) - 1  # headers
+    assert rows % 7  # 7 does not divide the rows: a short last chunk
+    assert compare(datafile, chunksize) == []
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import backtrader as bt
+import backtrader.feeds as btfeeds
+import pytest
+
+import fastdt
+
+
+def load(datacls, dataname, **kwargs):
+    data = datacls(
+        dataname=dataname,
+        dtformat=fastdt.BINANCE_DTFORMAT,
+        timeframe=bt.TimeFrame.Minutes,
+        datetime=0, open=1, high=2, low=3, close=4, volume=5,
+        openinterest=-1,
+        **kwargs)
+    bt.Cerebro().adddata(data)
+    data._start()
+    data.preload()
+    return data
+
+
+@pytest.fixture
+def cached(request, datafile):
+    fastdt._cache.clear()
+    if request.param:
+        fastdt.cachefile(datafile)
+    yield request.param
+    fastdt._cache.clear()
+
+
+@pytest.mark.parametrize('cached', [False, True], indirect=True)
+@pytest.mark.parametrize('window', [
+    dict(),
+    dict(fromdate=datetime(2017, 7, 17, 6, 30),
+         todate=datetime(2017, 7, 18, 20, 15)),
+])
+def test_fast_feed_bit_identical(datafile, cached, window):
+    slow = load(btfeeds.GenericCSVData, datafile, **window)
+    fast = load(fastdt.FastCSVData, datafile, **window)
+
+    assert slow.buflen() > 0
+    assert slow.buflen() == fast.buflen()
+    for name in slow.getlinealiases():
+        assert (getattr(slow.lines, name).array.tobytes() ==
+                getattr(fast.lines, name).array.tobytes()), name
+
+
+def test_dtnum_bit_identical():
+    dt = datetime(2017, 7, 17, 23, 59, 58)
+    assert fastdt.dtnum(dt.strftime(fastdt.BINANCE_DTFORMAT)) == \
+        bt.date2num(dt)
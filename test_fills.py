@@ -0,0 +1,162 @@
+import backtrader as bt
+import pytest
+
+import fastdt
+import fills
+from fills import IntrabarBroker, IntrabarIndex, MakerTakerCommInfo
+
+
+def minutes(datafile):
+    return fastdt.FastCSVData(
+        dataname=datafile,
+        timeframe=bt.TimeFrame.Minutes,
+        datetime=0, open=1, high=2, low=3, close=4, volume=5,
+        openinterest=-1)
+
+
+class Windows(bt.Strategy):
+    def start(self):
+        self.windows = []
+
+    def next(self):
+        index, lo, hi = self.broker._window(self.data)
+        self.windows.append(
+            (lo, hi, self.data.volume[0], self.data.close[0]))
+
+
+@pytest.mark.parametrize('compression', [15, 30])
+def test_closetime_window_is_the_resampled_minutes(datafile, compression):
+    cerebro = bt.Cerebro()
+    data = cerebro.resampledata(minutes(datafile),
+                                timeframe=bt.TimeFrame.Minutes,
+                                compression=compression)
+
+    index = IntrabarIndex.fromcsv(datafile)
+    cerebro.broker = IntrabarBroker(closetime=True)
+    cerebro.broker.addintrabar(data, index)
+    cerebro.addstrategy(Windows)
+    windows = cerebro.run()[0].windows
+
+    # every minute bar in exactly one window, in order
+    assert windows[0][0] == 0
+    assert windows[-1][1] == len(index.prices)
+    for (_, hi, _, _), (lo, _, _, _) in zip(windows, windows[1:]):
+        assert hi == lo
+
+    # and the window of a bar holds the minutes it was resampled from
+    for lo, hi, volume, close in windows:
+        assert hi > lo
+        assert index.volume(lo, hi) == pytest.approx(volume)
+        assert index.prices[hi - 1] == close
+
+
+def test_vwap():
+    index = IntrabarIndex([1.0, 2.0, 3.0], [10.0, 20.0, 30.0], [1.0, 1.0, 2.0])
+    assert index.window(2.0, 3.0) == (1, 2)
+    assert index.window(2.0, 3.0, 'right') == (2, 3)
+    assert index.volume(0, 3) == 4.0
+
+    # the first trade whole, half of the second
+    assert index.vwap(0, 1.5) == pytest.approx((10.0 + 20.0 * 0.5) / 1.5)
+    assert index.vwap(1, 3.0) == pytest.approx((20.0 + 30.0 * 2.0) / 3.0)
+    # within a single trade: its price
+    assert index.vwap(2, 0.5) == pytest.approx(30.0)
+
+
+class Orders(bt.Strategy):
+    # sends the orders of ``make`` on the first bar, keeps every fill
+    params = (
+        ('make', None),
+    )
+
+    def start(self):
+        self.fills = []
+
+    def notify_order(self, order):
+        if order.status in (order.Partial, order.Completed):
+            bit = order.executed.exbits[-1]
+            self.fills.append((order.status, bit, self.data.volume[0],
+                               self.data.low[0], self.data.high[0]))
+
+    def next(self):
+        if len(self) == 1:
+            self.orders = self.p.make(self)
+
+
+def runorders(data, make, **brokerkw):
+    cerebro = bt.Cerebro()
+    cerebro.adddata(data)
+    cerebro.broker = IntrabarBroker(**brokerkw)
+    cerebro.broker.setcash(1000000.0)
+    cerebro.addstrategy(Orders, make=make)
+    return cerebro, cerebro.run()[0]
+
+
+def test_partial_fills_follow_volume(datafile):
+    # far more than a tenth of the volume of a bar
+    size = 2000.0
+    _, strat = runorders(minutes(datafile),
+                         lambda s: [s.buy(size=size)], participation=0.1)
+
+    order = strat.orders[0]
+    assert order.status == order.Completed
+    assert len(strat.fills) > 2
+    assert [status for status, _, _, _, _ in strat.fills] == \
+        [order.Partial] * (len(strat.fills) - 1) + [order.Completed]
+    for _, bit, volume, _, _ in strat.fills:
+        assert 0.0 < bit.size <= volume * 0.1 * (1.0 + 1e-12)
+    assert sum(bit.size for _, bit, _, _, _ in strat.fills) == \
+        pytest.approx(size)
+
+
+def test_market_order_pays_vwap(datafile):
+    cerebro = bt.Cerebro()
+    data = cerebro.resampledata(minutes(datafile),
+                                timeframe=bt.TimeFrame.Minutes,
+                                compression=15)
+    index = IntrabarIndex.fromcsv(datafile)
+    cerebro.broker = IntrabarBroker(closetime=True, participation=0.5,
+                                    spread=0.001)
+    cerebro.broker.addintrabar(data, index)
+    cerebro.broker.setcash(1000000.0)
+    cerebro.addstrategy(Orders, make=lambda s: [s.buy(size=10.0)])
+    strat = cerebro.run()[0]
+
+    order = strat.orders[0]
+    (_, bit, volume, low, high), = strat.fills
+    lo, hi = index.window(order.executed.dt - 15.0 / 1440.0 + fills.EPSILON,
+                          order.executed.dt + fills.EPSILON, 'right')
+    assert volume == pytest.approx(index.volume(lo, hi))
+    # the trades of the bar from the open on, half the spread above
+    price = index.vwap(lo, 10.0 / 0.5) * (1.0 + 0.0005)
+    assert bit.price == pytest.approx(min(max(price, low), high))
+
+
+def test_maker_and_taker_fees(datafile):
+    def make(strat):
+        close = strat.data.close[0]
+        return [strat.buy(size=1.0),
+                strat.buy(size=1.0, exectype=bt.Order.Limit,
+                          price=close * 2.0)]
+
+    cerebro = bt.Cerebro()
+    cerebro.adddata(minutes(datafile))
+    cerebro.broker = IntrabarBroker(participation=1.0)
+    cerebro.broker.addcommissioninfo(MakerTakerCommInfo(maker=0.0008,
+                                                        taker=0.001))
+    cerebro.broker.setcash(1000000.0)
+    cerebro.addstrategy(Orders, make=make)
+    strat = cerebro.run()[0]
+
+    market, limit = strat.orders
+    assert market.status == limit.status == bt.Order.Completed
+    assert market.executed.comm == pytest.approx(
+        market.executed.size * market.executed.price * 0.001)
+    assert limit.executed.comm == pytest.approx(
+        limit.executed.size * limit.executed.price * 0.0008)
+
+
+@pytest.mark.parametrize('participation', [0.0, -0.1, 1.5])
+def test_participation_validated(participation):
+    with pytest.raises(ValueError):
+        IntrabarBroker(participation=participation)
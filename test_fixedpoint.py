@@ -0,0 +1,113 @@
+from fractions import Fraction
+
+import backtrader as bt
+import pytest
+
+import fastdt
+from fixedpoint import FixedPointBroker, LotSizer
+
+
+def makecerebro(datafile, strategy, **brokerkw):
+    cerebro = bt.Cerebro()
+    cerebro.adddata(fastdt.FastCSVData(
+        dataname=datafile,
+        timeframe=bt.TimeFrame.Minutes,
+        datetime=0, open=1, high=2, low=3, close=4, volume=5,
+        openinterest=-1))
+    cerebro.broker = FixedPointBroker(**brokerkw)
+    cerebro.broker.setcash(0.50)
+    cerebro.broker.setcommission(commission=0.001)
+    cerebro.addstrategy(strategy)
+    return cerebro
+
+
+class RoundTrips(bt.Strategy):
+    # in and out of the market every few bars: hundreds of fills
+    def start(self):
+        self.orders = []
+
+    def notify_order(self, order):
+        if order.status == order.Completed:
+            self.orders.append(order)
+
+    def next(self):
+        if len(self) % 3:
+            return
+        if self.position:
+            self.sell(size=self.position.size)
+        else:
+            self.buy()
+
+
+def test_ledger_exact_over_round_trips(datafile):
+    cerebro = makecerebro(datafile, RoundTrips, tick=0.000001, lot=0.001)
+    cerebro.addsizer(LotSizer, percents=99)
+    strat = cerebro.run()[0]
+    broker = cerebro.broker
+    assert len(strat.orders) > 500
+
+    # every fill again, with fractions of the decimal numbers
+    cash = Fraction('0.50')
+    size = Fraction(0)
+    for order in strat.orders:
+        for bit in order.executed.exbits:
+            qty = Fraction(repr(bit.size))
+            notional = qty * Fraction(repr(bit.price))
+            comm = round(abs(notional) * Fraction('0.001') /
+                         Fraction(1, 10 ** 8)) * Fraction(1, 10 ** 8)
+            cash -= notional + comm
+            size += qty
+
+    assert broker.getcashunits() * broker.unit == cash
+    assert broker.getcash() == float(cash)
+    assert broker.getposition(strat.data).size == float(size)
+
+
+class Rules(bt.Strategy):
+    def start(self):
+        self.notified = []
+
+    def notify_order(self, order):
+        self.notified.append((order.ref, order.getstatusname()))
+
+    def next(self):
+        if len(self) != 1:
+            return
+        close = self.data.close[0]
+        self.small = self.buy(size=0.0015)  # 1 lot, under minqty
+        self.cheap = self.buy(size=0.0035)  # 3 lots, under minnotional
+        self.rounded = self.buy(size=0.0109)  # 10 lots
+        self.bracket = self.buy_bracket(size=0.0035, price=close,
+                                        stopprice=close * 0.9,
+                                        limitprice=close * 1.1)
+        self.oco = self.buy(size=0.01, exectype=bt.Order.Limit,
+                            price=close * 0.5)
+        self.ocorefused = self.buy(size=0.0015, exectype=bt.Order.Limit,
+                                   price=close * 0.5, oco=self.oco)
+
+
+@pytest.mark.parametrize('checksubmit', [True, False])
+def test_exchange_rules(datafile, checksubmit):
+    # minnotional: 0.0002 of quote asset, ~4 lots at the prices of the data
+    cerebro = makecerebro(datafile, Rules, tick=0.000001, lot=0.001,
+                          minqty=0.002, minnotional=0.0002)
+    cerebro.broker.set_checksubmit(checksubmit)
+    strat = cerebro.run()[0]
+    broker = cerebro.broker
+
+    assert strat.small.status == bt.Order.Rejected
+    assert strat.cheap.status == bt.Order.Rejected
+
+    assert strat.rounded.status == bt.Order.Completed
+    assert strat.rounded.executed.size == 0.010
+    price = strat.rounded.executed.exbits[-1].price
+    assert price == broker.roundprice(price)
+
+    # the whole bracket is refused, nothing left waiting for its parent
+    assert all(o.status == bt.Order.Rejected for o in strat.bracket)
+    assert not any(broker._pchildren.values())
+
+    # and the oco order of a refused order is cancelled
+    assert strat.ocorefused.status == bt.Order.Rejected
+    assert strat.oco.status == bt.Order.Canceled
+    assert (strat.oco.ref, 'Canceled') in strat.notified
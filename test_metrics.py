@@ -0,0 +1,46 @@
+import contextlib
+import os
+
+import pytest
+
+import runner
+from dual_ema_example import EMAStrategy
+
+
+class Counted(EMAStrategy):
+    # Keeps every order created, whatever the broker does with it
+    def start(self):
+        super(Counted, self).start()
+        self.created = []
+
+    def buy(self, *args, **kwargs):
+        order = super(Counted, self).buy(*args, **kwargs)
+        self.created.append(order)
+        return order
+
+    def sell(self, *args, **kwargs):
+        order = super(Counted, self).sell(*args, **kwargs)
+        self.created.append(order)
+        return order
+
+
+@pytest.mark.parametrize('checksubmit', [True, False])
+def test_every_order_counted_once(datafile, checksubmit):
+    config = runner.merge(dict(
+        strategy=Counted,
+        data=dict(dataname=datafile),
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+        analyzers=dict(metrics=dict(name='metrics:RunMetrics')),
+    ))
+    cerebro = runner.makecerebro(config)
+    cerebro.broker.set_checksubmit(checksubmit)
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            strat = cerebro.run()[0]
+
+    metrics = strat.analyzers.metrics.get_analysis()
+    assert strat.created
+    assert metrics['orders_created'] == len(strat.created)
+    assert metrics['orders_filled'] == sum(
+        order.status == order.Completed for order in strat.created)
@@ -0,0 +1,61 @@
+import contextlib
+import os
+
+import numpy as np
+import pytest
+
+import runner
+from dual_ema_example import EMAStrategy
+from monte_carlo import TradeList, simulate
+
+
+class ClosedCash(TradeList):
+    # long only and flat between trades: the cash when a trade closes is
+    # the value of the portfolio
+    def start(self):
+        super(ClosedCash, self).start()
+        self.cash = None
+
+    def notify_trade(self, trade):
+        super(ClosedCash, self).notify_trade(trade)
+        if trade.isclosed:
+            self.cash = self.strategy.broker.getcash()
+
+
+@pytest.fixture(scope='module')
+def trades(datafile):
+    cerebro = runner.makecerebro(runner.merge(dict(
+        strategy=EMAStrategy,
+        data=dict(dataname=datafile),
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+        analyzers=dict(trades=ClosedCash),
+    )))
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            strat = cerebro.run()[0]
+    return strat.analyzers.trades
+
+
+def test_returns_compound_to_the_run(trades):
+    returns = np.asarray(trades.get_analysis())
+    assert len(returns) > 10
+    assert 0.50 * np.prod(1.0 + returns) == pytest.approx(trades.cash,
+                                                         rel=1e-12)
+
+
+def test_permutation_keeps_final_value(trades):
+    returns = trades.get_analysis()
+    result = simulate(returns, 0.50, npaths=200, method='permutation',
+                      batchsize=64, workers=1)
+    final = 0.50 * np.prod(1.0 + np.asarray(returns))
+    assert np.allclose(result['value'], final, rtol=1e-12, atol=0.0)
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'permutation'])
+def test_result_independent_of_workers(trades, method):
+    results = [simulate(trades.get_analysis(), 0.50, npaths=500, method=method,
+                        batchsize=100, workers=workers, seed=3)
+               for workers in (1, 2)]
+    for name in ('drawdown', 'value', 'sqn'):
+        np.testing.assert_array_equal(results[0][name], results[1][name])
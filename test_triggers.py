@@ -0,0 +1,42 @@
+import contextlib
+import os
+
+import pytest
+
+import runner
+
+
+def run(datafile, mode, eventskip):
+    config = runner.merge(dict(
+        strategy='dual_ema_example:EMAStrategy',
+        params=dict(eventskip=eventskip),
+        data=dict(dataname=datafile),
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+        analyzers=dict(ta='TradeAnalyzer', sqn='SQN'),
+        mode=mode,
+        chunksize=100,
+    ))
+    cerebro = runner.makecerebro(config)
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            strat = cerebro.run()[0]
+
+    analyzers = dict((name, runner.analyzerInfo(analyzer))
+                     for name, analyzer in (('ta', strat.analyzers.ta),
+                                            ('sqn', strat.analyzers.sqn)))
+    return cerebro.broker.getvalue(), analyzers, strat.nextcalls, len(strat)
+
+
+@pytest.mark.parametrize('mode', ['memory', 'chunked'])
+def test_eventskip_changes_only_next_calls(datafile, mode):
+    value, analyzers, nextcalls, bars = run(datafile, mode, True)
+    allvalue, allanalyzers, allnextcalls, allbars = run(datafile, mode, False)
+
+    assert value == allvalue
+    assert analyzers == allanalyzers
+    assert analyzers['ta']['total_trade'] > 0
+
+    # one call per bar after the warm up without eventskip
+    assert bars == allbars
+    assert 0 < nextcalls < allnextcalls <= allbars
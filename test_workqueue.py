@@ -0,0 +1,66 @@
+import pytest
+
+import workqueue
+
+
+def sweep(dataname):
+    return dict(
+        strategy='dual_ema_example:EMAStrategy',
+        params=dict(shortperiod=[5, 10], longperiod=[30, 40]),
+        data=dict(dataname=dataname),
+        sizer=dict(name='PercentSizer', percents=99),
+        broker=dict(cash=0.50, commission=0.001),
+    )
+
+
+@pytest.fixture
+def queue(tmp_path, datafile):
+    path = str(tmp_path / 'queue.db')
+    conn = workqueue.connect(path)
+    assert workqueue.push(conn, [sweep(datafile)]) == 4
+    yield path, conn
+    conn.close()
+
+
+def test_push_twice_adds_nothing(queue, datafile):
+    path, conn = queue
+    assert workqueue.push(conn, [sweep(datafile)]) == 0
+    assert workqueue.status(conn) == dict(pending=4)
+
+
+def test_workers_finish_everything(queue):
+    path, conn = queue
+    assert workqueue.run_workers(path, workers=2, lease=1.5) == 4
+    assert workqueue.status(conn) == dict(done=4)
+
+    results = list(workqueue.results(conn))
+    assert len(results) == 4
+    assert len(set(r['id'] for r in results)) == 4
+
+
+def test_expired_lease_taken_over(queue):
+    path, conn = queue
+    uid, _ = workqueue.claim(conn, 'crashed', lease=0.5)
+
+    # the unit of the crashed worker is still running when the other ones
+    # are done: the live worker waits for its lease to expire
+    assert workqueue.work(path, 'alive', lease=0.5) == 4
+    assert workqueue.status(conn) == dict(done=4)
+    worker, attempts = conn.execute(
+        'SELECT worker, attempts FROM units WHERE id = ?', (uid,)).fetchone()
+    assert (worker, attempts) == ('alive', 2)
+
+
+def test_failing_unit_ends_failed(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    conn = workqueue.connect(path)
+    workqueue.push(conn, [dict(sweep(str(tmp_path / 'missing.csv')),
+                               params=dict())])
+
+    assert workqueue.work(path, 'worker', maxattempts=2) == 0
+    assert workqueue.status(conn) == dict(failed=1)
+    attempts, error = conn.execute(
+        'SELECT attempts, error FROM units').fetchone()
+    assert attempts == 2
+    assert 'missing.csv' in error
+    conn.close()
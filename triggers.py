@@ -0,0 +1,140 @@
+import backtrader as bt
+
+
+class TriggerStrategy(bt.Strategy):
+    '''
+    Strategy whose ``next`` is only called on bars where its decision can
+    change.
+
+    The strategy declares in ``__init__`` the conditions which can change
+    its decision as indicator expressions, e.g.::
+
+        self.addtrigger(bt.ind.CrossOver(self.short_ema, self.long_ema) != 0)
+
+    ``next`` is then called on the first bar (``nextstart``), on bars where
+    any trigger is non zero and on bars with order notifications. On any
+    other bar the engine still advances indicators, fills orders in the
+    broker and feeds analyzers and observers, only the call to ``next`` is
+    saved.
+
+    When cerebro runs in ``runonce`` mode the triggers have already been
+    calculated for all the bars and each one is turned into a boolean mask
+    once (read at the position of its own line, triggers on different
+    datas need not share a clock), otherwise they are checked bar by bar.
+
+    Indicators built only for the triggers do not count for the minimum
+    period of the strategy, so triggers never delay the first ``next``.
+
+    ``nextcalls`` counts the calls to ``next`` actually made, also without
+    triggers or with ``eventskip`` off (one call per bar then).
+    '''
+    params = (
+        ('eventskip', True),
+    )
+
+    def addtrigger(self, trigger):
+        if not hasattr(self, '_triggers'):
+            self._triggers = []
+        self._triggers.append(trigger)
+
+    def _triggeronly(self):
+        # ids of the indicators only built to calculate the triggers, i.e.
+        # reachable from a trigger and not kept as an attribute
+        kept = set(id(x) for x in vars(self).values())
+        seen = set()
+        stack = list(getattr(self, '_triggers', []))
+        while stack:
+            obj = stack.pop()
+            if id(obj) in seen or id(obj) in kept:
+                continue
+            seen.add(id(obj))
+            stack.extend(getattr(obj, 'datas', []))
+            # operands of line operations like "crossover != 0" and the
+            # indicator owning the operand line
+            for attr in ('a', 'b'):
+                operand = getattr(obj, attr, None)
+                if isinstance(operand, bt.LineRoot):
+                    stack.append(operand)
+                    owner = getattr(operand, '_owner', None)
+                    if isinstance(owner, bt.Indicator):
+                        stack.append(owner)
+
+        return seen
+
+    def _periodset(self):
+        # Triggers must not delay the first next: leave the indicators
+        # built only for them out of the minimum period calculation
+        indtype = bt.LineIterator.IndType
+        indicators = self._lineiterators[indtype]
+        onlytriggers = self._triggeronly()
+        self._lineiterators[indtype] = [
+            x for x in indicators if id(x) not in onlytriggers]
+        try:
+            super(TriggerStrategy, self)._periodset()
+        finally:
+            self._lineiterators[indtype] = indicators
+
+    def _start(self):
+        super(TriggerStrategy, self)._start()
+
+        self.nextcalls = 0
+        self._notified = False
+        self._firstnext = True
+        self._triggermasks = None
+
+        # the engine calls self.next(), which now goes through the gate
+        # or, without it, only counts the call
+        self._usernext = self.next
+        if self.p.eventskip and getattr(self, '_triggers', None):
+            self.next = self._triggerednext
+        else:
+            self.next = self._countednext
+
+    def _notify(self, qorders=[], qtrades=[]):
+        if qorders or self._orderspending:
+            self._notified = True
+
+        super(TriggerStrategy, self)._notify(qorders=qorders, qtrades=qtrades)
+
+    def _maketriggermasks(self):
+        # (line, non zero and not NaN for every bar of the line) for every
+        # trigger. numpy only here: it is not needed to start without
+        # runonce
+        import numpy as np
+
+        masks = []
+        for trigger in self._triggers:
+            line = trigger.lines[0]
+            values = np.array(line.array, dtype=np.float64)
+            masks.append((line, (values != 0.0) & ~np.isnan(values)))
+
+        return masks
+
+    def _triggered(self):
+        # cerebro only runs once on preloaded data (not e.g. resampled)
+        if self.cerebro._dopreload and self.cerebro._dorunonce:
+            if self._triggermasks is None:
+                self._triggermasks = self._maketriggermasks()
+            for line, mask in self._triggermasks:
+                if mask[line.idx]:
+                    return True
+            return False
+
+        for trigger in self._triggers:
+            value = trigger.lines[0][0]
+            if value == value and value != 0.0:  # not NaN and non zero
+                return True
+
+        return False
+
+    def _triggerednext(self):
+        fire = self._firstnext or self._notified or self._triggered()
+        self._firstnext = self._notified = False
+
+        if fire:
+            self.nextcalls += 1
+            self._usernext()
+
+    def _countednext(self):
+        self.nextcalls += 1
+        self._usernext()
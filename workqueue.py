@@ -0,0 +1,365 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+import runner
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS units (
+    id TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    leased REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS units_status ON units (status, leased);
+'''
+
+# Seconds a claimed unit stays with its worker without a heartbeat
+LEASE = 300.0
+
+# Most seconds an idle worker waits before checking the queue again
+POLL = 5.0
+
+# Attempts before a unit is left as failed
+MAXATTEMPTS = 3
+
+
+def connect(path, shared=False):
+    '''
+    Connection to the queue database, created if needed. WAL mode lets the
+    workers read while one of them writes; writers wait for each other.
+
+    WAL keeps its index in shared memory, so it only works for workers on
+    the host of the database. With ``shared`` (workers on other machines,
+    the database on a network filesystem with working locks) the rollback
+    journal is used instead: readers then wait for the writer too.
+    '''
+    conn = sqlite3.connect(path, timeout=60.0, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=%s' % ('DELETE' if shared else 'WAL'))
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextlib.contextmanager
+def transaction(conn):
+    # Explicit write transactions: the connection is in autocommit mode
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def _ref(value):
+    # json for what configurations written in python may hold
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, type):
+        return '%s:%s' % (value.__module__, value.__name__)
+    raise TypeError('Cannot store %r in the queue' % (value,))
+
+
+def units(configs, symbols=None, windows=None):
+    '''
+    Expands ``configs`` into work units: every param combination of every
+    configuration for every symbol (data file) and window (fromdate,
+    todate). The name of a unit tells its symbol and window apart.
+    '''
+    for config in configs:
+        for run in runner.expand(config):
+            for symbol in symbols or [None]:
+                for window in windows or [None]:
+                    unit = json.loads(json.dumps(run, default=_ref))
+                    name = [unit['name']]
+                    if symbol is not None:
+                        unit['data']['dataname'] = symbol
+                        name.append(os.path.basename(symbol))
+                    if window is not None:
+                        unit['data']['fromdate'], unit['data']['todate'] = \
+                            window
+                        name.append('%s..%s' % window)
+                    unit['name'] = ':'.join(str(n) for n in name)
+                    unit['plot'] = False
+                    yield unit
+
+
+def unitid(unit):
+    '''The same unit always gets the same id, whoever pushes it'''
+    text = json.dumps(unit, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def push(conn, configs, symbols=None, windows=None):
+    '''Adds the units not already in the queue, returns how many'''
+    rows = [(unitid(u), json.dumps(u, sort_keys=True))
+            for u in units(configs, symbols, windows)]
+    before = conn.total_changes
+    with transaction(conn):
+        conn.executemany(
+            'INSERT OR IGNORE INTO units (id, config) VALUES (?, ?)', rows)
+    return conn.total_changes - before
+
+
+def claim(conn, worker, lease=LEASE, maxattempts=MAXATTEMPTS):
+    '''
+    Takes a pending unit, or one whose worker stopped renewing its lease
+    (crashed), and returns (id, config) or None when nothing is left
+    '''
+    now = time.time()
+    with transaction(conn):
+        # crashed once too often: leave it for inspection
+        conn.execute(
+            "UPDATE units SET status = 'failed', error = 'Lease expired' "
+            "WHERE status = 'running' AND leased < ? AND attempts >= ?",
+            (now, maxattempts))
+        row = conn.execute(
+            "SELECT id, config FROM units WHERE attempts < ? AND "
+            "(status = 'pending' OR (status = 'running' AND leased < ?)) "
+            "LIMIT 1", (maxattempts, now)).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE units SET status = 'running', worker = ?, "
+                "leased = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker, now + lease, row[0]))
+
+    if row is None:
+        return None
+    return row[0], json.loads(row[1])
+
+
+def renew(conn, uid, worker, lease=LEASE):
+    with transaction(conn):
+        conn.execute(
+            "UPDATE units SET leased = ? WHERE id = ? AND worker = ? AND "
+            "status = 'running'", (time.time() + lease, uid, worker))
+
+
+def complete(conn, uid, worker, result):
+    '''
+    Stores the result of a unit. A unit already done keeps its first
+    result: running a unit twice (lease expired under a slow worker)
+    changes nothing.
+    '''
+    with transaction(conn):
+        conn.execute(
+            "UPDATE units SET status = 'done', worker = ?, result = ?, "
+            "error = NULL WHERE id = ? AND status != 'done'",
+            (worker, json.dumps(result, sort_keys=True), uid))
+
+
+def fail(conn, uid, worker, error, maxattempts=MAXATTEMPTS):
+    '''Back to pending to be retried, or failed after ``maxattempts``'''
+    with transaction(conn):
+        conn.execute(
+            "UPDATE units SET status = CASE WHEN attempts < ? "
+            "THEN 'pending' ELSE 'failed' END, error = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (maxattempts, error, uid, worker))
+
+
+def retry(conn):
+    '''Gives the failed units a new set of attempts'''
+    with transaction(conn):
+        return conn.execute(
+            "UPDATE units SET status = 'pending', attempts = 0 "
+            "WHERE status = 'failed'").rowcount
+
+
+def status(conn):
+    return dict(conn.execute(
+        'SELECT status, COUNT(*) FROM units GROUP BY status').fetchall())
+
+
+def running(conn):
+    '''Units claimed by a worker and not finished yet'''
+    return conn.execute(
+        "SELECT COUNT(*) FROM units WHERE status = 'running'").fetchone()[0]
+
+
+def results(conn):
+    '''The results of the units done, as written by runner.py --output'''
+    for (result,) in conn.execute(
+            "SELECT result FROM units WHERE status = 'done' ORDER BY id"):
+        yield json.loads(result)
+
+
+class _Heartbeat(threading.Thread):
+    # Renews the lease of the running unit, on its own connection
+    def __init__(self, path, uid, worker, lease, shared=False):
+        super(_Heartbeat, self).__init__()
+        self.daemon = True
+        self.path, self.uid, self.worker, self.lease = path, uid, worker, lease
+        self.shared = shared
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = connect(self.path, self.shared)
+        try:
+            while not self.stopped.wait(self.lease / 3.0):
+                renew(conn, self.uid, self.worker, self.lease)
+        finally:
+            conn.close()
+
+
+def work(path, worker=None, lease=LEASE, maxattempts=MAXATTEMPTS,
+         shared=False):
+    '''
+    Runs units from the queue at ``path`` until none is left. Returns the
+    number of units done by this worker. ``shared`` as in ``connect``.
+
+    While other workers still run units the worker waits (checking every
+    third of the lease, at most every ``POLL`` seconds) instead of leaving:
+    if one of them crashes, its unit is taken over when the lease expires,
+    and it leaves soon after the last one finishes.
+    '''
+    import fastdt
+
+    worker = worker or '%s:%d' % (socket.gethostname(), os.getpid())
+    conn = connect(path, shared)
+    cached = set()
+    done = 0
+    try:
+        while True:
+            claimed = claim(conn, worker, lease, maxattempts)
+            if claimed is None:
+                if not running(conn):
+                    return done
+                time.sleep(min(lease / 3.0, POLL))
+                continue
+
+            uid, config = claimed
+            heartbeat = _Heartbeat(path, uid, worker, lease, shared)
+            heartbeat.start()
+            try:
+                data = config['data']
+                if (data['format'] == 'binance' and
+                        config['mode'] == 'memory' and
+                        data['dataname'] not in cached):
+                    # parsed once per worker for all its units
+                    fastdt.cachefile(data['dataname'])
+                    cached.add(data['dataname'])
+
+                result = runner._runquiet(config)
+            except Exception:
+                fail(conn, uid, worker, traceback.format_exc(), maxattempts)
+            else:
+                result['id'] = uid
+                complete(conn, uid, worker, result)
+                done += 1
+            finally:
+                heartbeat.stopped.set()
+                heartbeat.join()
+    finally:
+        conn.close()
+
+
+def _work(args):
+    return work(*args)
+
+
+def run_workers(path, workers=None, lease=LEASE, maxattempts=MAXATTEMPTS,
+                shared=False):
+    '''``workers`` local worker processes on the queue, until it is empty'''
+    workers = workers or multiprocessing.cpu_count()
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(workers) as pool:
+        return sum(pool.map(_work, [(path, None, lease, maxattempts,
+                                     shared)] * workers))
+
+
+def _window(value):
+    fromdate, sep, todate = value.partition(':')
+    if not sep:
+        raise argparse.ArgumentTypeError('Window must be FROM:TO')
+    return fromdate, todate
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Parameter sweeps over a sqlite work queue')
+    parser.add_argument('queue', help='Queue database file')
+    parser.add_argument('--shared', action='store_true',
+                        help='Workers on several machines share the database '
+                             'on a network filesystem (no WAL mode)')
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+
+    p = sub.add_parser('push', help='Add the units of configuration files')
+    p.add_argument('configs', nargs='+', help='Configuration files')
+    p.add_argument('--symbols', nargs='+', default=None,
+                   help='Data files to run every configuration on')
+    p.add_argument('--windows', nargs='+', type=_window, default=None,
+                   help='YYYY-MM-DD:YYYY-MM-DD windows to run on')
+
+    p = sub.add_parser('work', help='Run units until the queue is empty')
+    p.add_argument('--workers', type=int, default=1,
+                   help='Worker processes (0: all cpus)')
+    p.add_argument('--lease', type=float, default=LEASE,
+                   help='Seconds without heartbeat before a unit is '
+                        'given to another worker')
+    p.add_argument('--maxattempts', type=int, default=MAXATTEMPTS)
+
+    sub.add_parser('status', help='Units by status')
+    sub.add_parser('retry', help='Retry the failed units')
+
+    p = sub.add_parser('results', help='Write the results as json lines')
+    p.add_argument('--output', default=None, help='File (default: stdout)')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    conn = connect(args.queue, args.shared)
+
+    if args.command == 'push':
+        added = push(conn, runner.load_configs(args.configs), args.symbols,
+                     args.windows)
+        print('{} units added'.format(added))
+
+    elif args.command == 'work':
+        conn.close()
+        if args.workers == 1:
+            done = work(args.queue, lease=args.lease,
+                        maxattempts=args.maxattempts, shared=args.shared)
+        else:
+            done = run_workers(args.queue, args.workers or None, args.lease,
+                               args.maxattempts, args.shared)
+        print('{} units done'.format(done))
+
+    elif args.command == 'status':
+        for name, count in sorted(status(conn).items()):
+            print('{}: {}'.format(name, count))
+
+    elif args.command == 'retry':
+        print('{} units to retry'.format(retry(conn)))
+
+    elif args.command == 'results':
+        out = open(args.output, 'w') if args.output else sys.stdout
+        try:
+            for result in results(conn):
+                out.write(json.dumps(result, sort_keys=True) + '\n')
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+
+if __name__ == '__main__':
+    main()